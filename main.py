@@ -1,34 +1,80 @@
 import logging
-import traceback
 import uuid
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
-import os
+from typing import Dict, Any, List, Tuple
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+import aiofiles.os as aos
+import orjson
+from arq import create_pool
+from arq.connections import RedisSettings
+from fastapi import Depends, FastAPI, File, Query, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Importar configuraciones
+from models.settings import Settings, get_settings
+
+# Configurar logging una sola vez (los módulos solo crean sus loggers)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=get_settings().log_level
+    )
 logger = logging.getLogger("MainApp")
+from utils.api_utils import (
+    ContentLengthLimitMiddleware,
+    save_temp_file,
+    save_temp_files,
+    upload_size_limits,
+    validate_document,
+)
+from utils.job_store import JobStore, JobStatus, now_ns, ns_to_iso
+
+# ================================
+# ALMACENAMIENTO DE JOBS (Redis)
+# Compartido entre workers, con expiración por TTL
+# ================================
+
+job_store: JobStore = None  # Se inicializa en el arranque
+arq_pool = None  # Cola de trabajos arq, se inicializa en el arranque
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abre el job store y la cola de trabajos al arrancar y cierra conexiones al apagar."""
+    global job_store, arq_pool
+    settings = get_settings()
+    job_store = JobStore(
+        settings.redis_url,
+        ttl_seconds=settings.job_ttl_seconds,
+        active_timeout_seconds=settings.batch_job_timeout
+    )
+    arq_pool = await create_pool(RedisSettings.from_dsn(settings.redis_url))
+    yield
+    await arq_pool.aclose()
+    await job_store.close()
 
-# Importar pipeline y configuraciones
-from pipeline import Pipeline
-from models.settings import settings
-from utils.api_utils import validate_document, save_temp_file
 
 # Crear app FastAPI
 app = FastAPI(
     title="Procesador de Documentos de Identidad",
     description="API escalable para procesar PDFs e imágenes de documentos de identidad (DNI, licencias)",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Rechazar subidas demasiado grandes por Content-Length antes de leer el cuerpo.
+# Se registra antes que CORS (el último añadido es el más externo) para que
+# el 413 también lleve las cabeceras CORS y el navegador pueda leerlo
+app.add_middleware(ContentLengthLimitMiddleware, limits=upload_size_limits())
+
 # Configurar CORS para desarrollo
 app.add_middleware(
     CORSMiddleware,
@@ -38,20 +84,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ================================
-# ALMACENAMIENTO EN MEMORIA (Para desarrollo)
-# En producción usar Redis, PostgreSQL, etc.
-# ================================
-
-job_storage = {}  # {job_id: job_data}
-pipeline = Pipeline()
-
-class JobStatus:
-    PENDING = "PENDING"
-    PROCESSING = "PROCESSING"
-    COMPLETED = "COMPLETED"
-    FAILED = "FAILED"
-
 # ================================
 # FUNCIONES AUXILIARES
 # ================================
@@ -60,97 +92,75 @@ def create_job_id() -> str:
     """Genera un ID único para el trabajo."""
     return str(uuid.uuid4())
 
-async def process_file_background(job_id: str, file_path: str, filename: str):
-    """Procesa el archivo en background y actualiza el estado."""
-    try:
-        logger.info(f"[{job_id}] Iniciando procesamiento de: {filename}")
-        
-        # Actualizar estado a PROCESSING
-        job_storage[job_id].update({
-            "status": JobStatus.PROCESSING,
-            "started_at": datetime.now().isoformat()
-        })
 
-        # Procesar archivo con el pipeline
-        result = await pipeline.process(file_path=file_path, filename=filename)
-        
-        # Verificar si el procesamiento falló según el resultado
-        if result and result.get("processing_control", {}).get("status") == "FAILED":
-            # El pipeline falló, marcar job como FAILED
-            error_details = result.get("error_details", {})
-            error_msg = "; ".join(error_details.get("errors", ["Error desconocido en pipeline"]))
-            
-            job_storage[job_id].update({
-                "status": JobStatus.FAILED,
-                "completed_at": datetime.now().isoformat(),
-                "error": error_msg,
-                "error_details": error_details
-            })
-            
-            logger.error(f"[{job_id}] Pipeline falló: {error_msg}")
-            return
-        
-        # Verificar si el resultado es None (error crítico)
-        if result is None:
-            job_storage[job_id].update({
-                "status": JobStatus.FAILED,
-                "completed_at": datetime.now().isoformat(),
-                "error": "Error crítico en pipeline - resultado nulo"
-            })
-            
-            logger.error(f"[{job_id}] Error crítico: resultado nulo")
-            return
-        
-        # Procesamiento exitoso
-        # Extraer métricas de procesamiento para el frontend
-        extracted_data = result.get("extracted_data", {})
-        debug_info = result.get("debug_info", {})
-        ocr_stats = debug_info.get("ocr_stats", {})
-        processing_metrics = result.get("processing_control", {}).get("time_metrics", {})
-        processing_data = result.get("processing_data", {})
-        
-        # Crear estructura mejorada para el frontend
-        enhanced_result = {
-            "extracted_data": {
-                **extracted_data,
-                "texto_extraido": processing_data.get("raw_text", "")
-            },
-            "processing_metrics": {
-                "ocr_confidence": round(ocr_stats.get("ocr_confidence", 0), 1),
-                "processing_time": round(processing_metrics.get("total_time", 0), 1),
-                "text_length": len(processing_data.get("raw_text", "")),
-                "ocr_method": ocr_stats.get("ocr_method", "Google Vision API")
-            },
-            "raw_result": result  # Mantener resultado completo para debugging
-        }
-        
-        job_storage[job_id].update({
-            "status": JobStatus.COMPLETED,
-            "completed_at": datetime.now().isoformat(),
-            "result": enhanced_result
-        })
-        
-        logger.info(f"[{job_id}] Procesamiento completado exitosamente")
-        
+async def register_job(
+    job_id: str,
+    filename: str,
+    temp_file_path: Path,
+    file_size: int,
+    document_hash: str,
+    settings: Settings
+) -> bool:
+    """
+    Crea el job en el store y, si el documento ya fue procesado antes,
+    lo completa con el resultado cacheado.
+
+    Returns:
+        True si el job se completó desde la cache (no hay que encolarlo).
+    """
+    await job_store.create(job_id, {
+        "job_id": job_id,
+        "status": JobStatus.PENDING,
+        "filename": filename,
+        "file_size_mb": round(file_size / (1024 * 1024), 2),
+        "created_at": now_ns(),
+        "file_path": str(temp_file_path),
+        "document_hash": document_hash
+    })
+
+    # Documento idéntico ya procesado: reutilizar resultado sin pasar por el pipeline
+    cached_result = None
+    if settings.document_cache_ttl_seconds:
+        cached_result = await job_store.get_document_result(document_hash)
+
+    if cached_result is None:
+        return False
+
+    await job_store.set_result(job_id, cached_result)
+    await job_store.finish(
+        job_id,
+        status=JobStatus.COMPLETED,
+        completed_at=now_ns()
+    )
+    await aos.remove(temp_file_path)
+
+    logger.info(f"[{job_id}] Resultado reutilizado para documento {document_hash[:12]}")
+    return True
+
+
+async def enqueue_or_fail(jobs: List[Tuple[str, Path]], function: str, *args: Any, **kwargs: Any) -> None:
+    """
+    Encola una tarea en arq. Si el encolado falla, marca los jobs ya
+    registrados como fallidos y borra sus archivos temporales para que
+    no queden en PENDING para siempre.
+
+    Args:
+        jobs: Pares (job_id, ruta temporal) afectados por la tarea
+        function: Nombre de la tarea del worker
+    """
+    try:
+        await arq_pool.enqueue_job(function, *args, **kwargs)
     except Exception as e:
-        logger.error(f"[{job_id}] Error en procesamiento: {str(e)}")
-        logger.error(traceback.format_exc())
-        
-        # Actualizar con error
-        job_storage[job_id].update({
-            "status": JobStatus.FAILED,
-            "completed_at": datetime.now().isoformat(),
-            "error": str(e)
-        })
-    
-    finally:
-        # Limpiar archivo temporal
-        try:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-                logger.info(f"[{job_id}] Archivo temporal eliminado: {file_path}")
-        except Exception as e:
-            logger.error(f"[{job_id}] Error eliminando archivo: {e}")
+        for job_id, temp_file_path in jobs:
+            await job_store.finish(
+                job_id,
+                status=JobStatus.FAILED,
+                completed_at=now_ns(),
+                error=f"No se pudo encolar el job: {e}"
+            )
+            with suppress(OSError):
+                await aos.remove(temp_file_path)
+        raise
 
 # ================================
 # ENDPOINTS
@@ -158,8 +168,8 @@ async def process_file_background(job_id: str, file_path: str, filename: str):
 
 @app.post("/upload")
 async def upload_document(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    settings: Settings = Depends(get_settings)
 ) -> Dict[str, Any]:
     """
     Endpoint para subir documentos (PDF o imágenes) y iniciar procesamiento asíncrono.
@@ -170,41 +180,44 @@ async def upload_document(
     
     Args:
         file: Archivo PDF o imagen del documento de identidad (DNI, licencia, etc.)
+        settings: Configuración de la aplicación (inyectada)
         
     Returns:
         Dict con job_id y estado inicial
     """
     try:
-        # Validar archivo (PDF o imagen)
-        file_content = validate_document(file)
+        # Validar nombre y extensión del archivo
+        ext = validate_document(file)
+        file_type = "PDF" if ext == ".pdf" else "Imagen"
 
         # Crear job ID único
         job_id = create_job_id()
         
-        # Guardar archivo temporal
-        temp_file_path = save_temp_file(file_content, file.filename, Path(settings.temp_dir))
+        # Guardar archivo temporal por bloques (valida contenido y tamaño)
+        temp_file_path, file_size, document_hash = await save_temp_file(file, Path(settings.temp_dir))
         logger.info(f"[{job_id}] Archivo guardado: {temp_file_path}")
 
-        # Validar que el archivo existe
-        if not temp_file_path.exists():
-            raise HTTPException(status_code=400, detail="El archivo no se pudo guardar correctamente.")
-
-        # Crear entrada en job_storage
-        job_storage[job_id] = {
-            "job_id": job_id,
-            "status": JobStatus.PENDING,
-            "filename": file.filename,
-            "file_size_mb": round(len(file_content) / (1024 * 1024), 2),
-            "created_at": datetime.now().isoformat(),
-            "file_path": str(temp_file_path)
-        }
-
-        # Iniciar procesamiento en background
-        background_tasks.add_task(
-            process_file_background,
+        # Crear entrada en el job store (o completarla desde la cache de documentos)
+        if await register_job(job_id, file.filename, temp_file_path, file_size, document_hash, settings):
+            return {
+                "job_id": job_id,
+                "status": JobStatus.COMPLETED,
+                "message": "Documento ya procesado anteriormente. Resultado disponible.",
+                "filename": file.filename,
+                "file_type": file_type,
+                "estimated_time_seconds": 0
+            }
+
+        # Encolar procesamiento para los workers
+        await enqueue_or_fail(
+            [(job_id, temp_file_path)],
+            "process_file",
             job_id,
             str(temp_file_path),
-            file.filename
+            file.filename,
+            document_hash,
+            file_size,
+            _job_id=job_id
         )
         
         logger.info(f"[{job_id}] Job creado para: {file.filename}")
@@ -214,15 +227,95 @@ async def upload_document(
             "status": JobStatus.PENDING,
             "message": "Documento subido exitosamente. Procesamiento iniciado.",
             "filename": file.filename,
-            "file_type": "PDF" if file.filename.lower().endswith('.pdf') else "Imagen",
+            "file_type": file_type,
             "estimated_time_seconds": 30  # Estimación
         }
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error en upload: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error en upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+@app.post("/process_batch")
+async def process_batch(
+    files: List[UploadFile] = File(...),
+    deferred: bool = Query(False, description="Extraer con el Batch API de OpenAI (50% más barato, resultados en hasta 24h)"),
+    settings: Settings = Depends(get_settings)
+) -> Dict[str, Any]:
+    """
+    Endpoint para subir varias imágenes en una sola petición.
+    Se crea un job por archivo (consultables con /status y /result) y los
+    pendientes se procesan juntos en el worker con concurrencia acotada.
+    Con `deferred=true` la extracción se envía al Batch API de OpenAI y los
+    jobs quedan en PROCESSING hasta que el batch termina.
+
+    Args:
+        files: Imágenes de documentos de identidad
+        deferred: Procesamiento no interactivo con el Batch API
+        settings: Configuración de la aplicación (inyectada)
+
+    Returns:
+        Dict con batch_id y el job de cada archivo
+    """
+    if len(files) > settings.batch_max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Demasiados archivos. Máximo por lote: {settings.batch_max_files}"
+        )
+
+    try:
+        for file in files:
+            validate_document(file)
+
+        # Escribir todos los archivos en paralelo (todo o nada)
+        saved = await save_temp_files(files, Path(settings.temp_dir))
+
+        batch_id = create_job_id()
+        jobs = []
+        pending = []
+        for file, (temp_file_path, file_size, document_hash) in zip(files, saved):
+            job_id = create_job_id()
+            cached = await register_job(job_id, file.filename, temp_file_path, file_size, document_hash, settings)
+            jobs.append({
+                "job_id": job_id,
+                "filename": file.filename,
+                "status": JobStatus.COMPLETED if cached else JobStatus.PENDING
+            })
+            if not cached:
+                pending.append({
+                    "job_id": job_id,
+                    "file_path": str(temp_file_path),
+                    "filename": file.filename,
+                    "document_hash": document_hash,
+                    "file_size": file_size
+                })
+
+        if pending:
+            await enqueue_or_fail(
+                [(job["job_id"], Path(job["file_path"])) for job in pending],
+                "submit_openai_batch" if deferred else "process_batch",
+                batch_id,
+                pending,
+                _job_id=batch_id
+            )
+
+        logger.info(f"[{batch_id}] Lote creado: {len(files)} archivos, {len(pending)} encolados")
+
+        message = f"{len(files)} documentos subidos. Procesamiento iniciado."
+        if deferred:
+            message += " Extracción diferida: resultados en hasta 24h."
+        return {
+            "batch_id": batch_id,
+            "jobs": jobs,
+            "message": message
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error en process_batch: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
@@ -237,31 +330,30 @@ async def get_job_status(job_id: str) -> Dict[str, Any]:
     Returns:
         Dict con estado actual del trabajo
     """
-    if job_id not in job_storage:
+    job_data = await job_store.get(job_id)
+    if job_data is None:
         raise HTTPException(status_code=404, detail="Job ID no encontrado")
     
-    job_data = job_storage[job_id]
-    
     response = {
         "job_id": job_id,
         "status": job_data["status"],
         "filename": job_data["filename"],
-        "created_at": job_data["created_at"]
+        "created_at": ns_to_iso(job_data["created_at"])
     }
     
     # Agregar campos específicos según el estado
     if job_data["status"] == JobStatus.PROCESSING and "started_at" in job_data:
-        response["started_at"] = job_data["started_at"]
+        response["started_at"] = ns_to_iso(job_data["started_at"])
     
     elif job_data["status"] == JobStatus.COMPLETED:
         response.update({
-            "completed_at": job_data["completed_at"],
+            "completed_at": ns_to_iso(job_data["completed_at"]),
             "result_available": True
         })
     
     elif job_data["status"] == JobStatus.FAILED:
         response.update({
-            "completed_at": job_data["completed_at"],
+            "completed_at": ns_to_iso(job_data["completed_at"]),
             "error": job_data["error"]
         })
     
@@ -269,7 +361,7 @@ async def get_job_status(job_id: str) -> Dict[str, Any]:
 
 
 @app.get("/result/{job_id}")
-async def get_job_result(job_id: str) -> Dict[str, Any]:
+async def get_job_result(job_id: str) -> Response:
     """
     Obtiene el resultado completo de un trabajo completado.
     
@@ -277,31 +369,36 @@ async def get_job_result(job_id: str) -> Dict[str, Any]:
         job_id: ID del trabajo
         
     Returns:
-        Dict con resultado completo del procesamiento
+        JSON con resultado completo del procesamiento (bytes pre-serializados)
     """
-    if job_id not in job_storage:
+    job_data = await job_store.get(job_id)
+    if job_data is None:
         raise HTTPException(status_code=404, detail="Job ID no encontrado")
     
-    job_data = job_storage[job_id]
-    
     if job_data["status"] != JobStatus.COMPLETED:
         raise HTTPException(
             status_code=400, 
             detail=f"El trabajo está en estado '{job_data['status']}'. Solo trabajos COMPLETED tienen resultados."
         )
     
-    result = job_data["result"].copy()
+    raw_result = await job_store.get_result(job_id)
+    if raw_result is None:
+        raise HTTPException(status_code=404, detail="Resultado no encontrado o expirado")
     
-    # Agregar metadata del job
-    result["job_metadata"] = {
-        "job_id": job_id,
-        "filename": job_data["filename"],
-        "file_size_mb": job_data["file_size_mb"],
-        "created_at": job_data["created_at"],
-        "completed_at": job_data["completed_at"]
-    }
+    # Agregar metadata del job insertándola en el JSON ya serializado
+    # (evita decodificar y volver a codificar el resultado completo)
+    metadata = orjson.dumps({
+        "job_metadata": {
+            "job_id": job_id,
+            "filename": job_data["filename"],
+            "file_size_mb": job_data["file_size_mb"],
+            "created_at": ns_to_iso(job_data["created_at"]),
+            "completed_at": ns_to_iso(job_data["completed_at"])
+        }
+    })
+    content = raw_result[:-1] + b"," + metadata[1:]
     
-    return result
+    return Response(content=content, media_type="application/json")
 
 
 @app.get("/jobs")
@@ -315,13 +412,11 @@ async def list_jobs(limit: int = 10) -> Dict[str, Any]:
     Returns:
         Lista de trabajos con información básica
     """
-    jobs = list(job_storage.values())
-    
-    # Ordenar por fecha de creación (más recientes primero)
-    jobs.sort(key=lambda x: x["created_at"], reverse=True)
-    
-    # Limitar cantidad
-    jobs = jobs[:limit]
+    # Índice ordenado por fecha de creación (más recientes primero), sin ordenar en Python
+    jobs = await job_store.list_recent(
+        limit,
+        fields=["job_id", "status", "filename", "created_at", "completed_at", "error"]
+    )
     
     # Simplificar información para la lista
     simplified_jobs = []
@@ -330,18 +425,18 @@ async def list_jobs(limit: int = 10) -> Dict[str, Any]:
             "job_id": job["job_id"],
             "status": job["status"],
             "filename": job["filename"],
-            "created_at": job["created_at"]
+            "created_at": ns_to_iso(job["created_at"])
         }
         
         if job["status"] == JobStatus.COMPLETED:
-            simplified["completed_at"] = job["completed_at"]
+            simplified["completed_at"] = ns_to_iso(job["completed_at"])
         elif job["status"] == JobStatus.FAILED:
             simplified["error"] = job.get("error", "Unknown error")
             
         simplified_jobs.append(simplified)
     
     return {
-        "total_jobs": len(job_storage),
+        "total_jobs": await job_store.count_jobs(),
         "jobs": simplified_jobs
     }
 
@@ -357,16 +452,17 @@ async def delete_job(job_id: str) -> Dict[str, Any]:
     Returns:
         Confirmación de eliminación
     """
-    if job_id not in job_storage:
+    job_data = await job_store.delete(job_id)
+    if job_data is None:
         raise HTTPException(status_code=404, detail="Job ID no encontrado")
     
-    job_data = job_storage.pop(job_id)
-    
     # Limpiar archivo si aún existe
-    if "file_path" in job_data and os.path.exists(job_data["file_path"]):
+    if "file_path" in job_data:
         try:
-            os.unlink(job_data["file_path"])
+            await aos.remove(job_data["file_path"])
             logger.info(f"Archivo eliminado: {job_data['file_path']}")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.warning(f"No se pudo eliminar archivo: {e}")
     
@@ -390,20 +486,34 @@ async def health_check() -> Dict[str, Any]:
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "active_jobs": len([j for j in job_storage.values() if j["status"] in [JobStatus.PENDING, JobStatus.PROCESSING]]),
-        "total_jobs": len(job_storage),
+        "active_jobs": await job_store.count_active_jobs(),
+        "total_jobs": await job_store.count_jobs(),
         "version": "2.0.0"
     }
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
 
-    # Configuración para desarrollo
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    if get_settings().debug_mode:
+        # Configuración para desarrollo: un proceso con autoreload
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
+    else:
+        # Producción: varios workers (el estado de jobs vive en Redis). "auto" usa
+        # uvloop + httptools si están instalados y asyncio + h11 donde no (Windows)
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            loop="auto",
+            http="auto",
+            workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+            log_level="info"
+        )
@@ -1,3 +1,4 @@
 from .state import PipelineState
-from .settings import Settings, settings
-from .prompts import generate_extraction_prompts
\ No newline at end of file
+from .settings import Settings, get_settings
+from .prompts import generate_extraction_prompts
+from .result import EnhancedResult, ResultMetrics
\ No newline at end of file
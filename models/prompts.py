@@ -1,5 +1,23 @@
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from models.settings import get_settings
 from models.state import PipelineState
-from models.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Import opcional: sin tiktoken el texto se recorta por caracteres (aprox. 4 por token)
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"tiktoken no disponible: {e}")
+    TIKTOKEN_AVAILABLE = False
+
+# Caracteres por token usados cuando no hay tokenizer
+CHARS_PER_TOKEN = 4
 
 # ================================
 # PROMPT PRINCIPAL - EXTRACCIÓN COMPLETA
@@ -7,9 +25,7 @@ from models.settings import settings
 
 EXTRACTION_SYSTEM_PROMPT = """Eres un experto en analizar texto de licencias de conducir o DNIs"""
 
-EXTRACTION_USER_PROMPT = """Analiza el siguiente texto de una licencia o dni y extrae los datos solicitados:
-
-INSTRUCCIONES:
+EXTRACTION_INSTRUCTIONS = """INSTRUCCIONES:
 1. Extrae SOLO la información que esté explícitamente presente en el texto
 2. Si un campo no está presente, usa null o lo que se especifique
 3. Mantén formatos originales (no inventes ni normalices a menos que se diga lo contrario)
@@ -38,35 +54,164 @@ CAMPOS A EXTRAER:
 - numero_documento: Número del documento
     - Debe ser el número completo, sin espacios ni guiones, en los DNI suele estar después de la palabra PER
     - Si es DNI tiene 8 digitos
-    - Si no está claro, usa null
+    - Si no está claro, usa null"""
+
+EXTRACTION_USER_PROMPT = """Analiza el siguiente texto de una licencia o dni y extrae los datos solicitados:
+
+""" + EXTRACTION_INSTRUCTIONS + """
 
 TEXTO DEL DOCUMENTO DE IDENTIDAD:
 {cleaned_text}
 
 Responde en formato JSON:"""
 
+# ================================
+# PROMPT MULTI-DOCUMENTO - VARIOS TEXTOS EN UNA LLAMADA
+# ================================
+
+EXTRACTION_MULTI_USER_PROMPT = """Analiza los siguientes textos, cada uno de una licencia o dni distinto, y extrae los datos solicitados de cada documento por separado:
+
+""" + EXTRACTION_INSTRUCTIONS + """
+
+DOCUMENTOS (índice entre corchetes):
+{documents}
+
+Responde en formato JSON con la forma {{"documentos": [...]}}: un objeto por documento, en el mismo orden que la entrada:"""
+
 # ================================
 # FUNCIÓN GENERADORA DE PROMPTS
 # ================================
 
-def generate_extraction_prompts(state: PipelineState) -> tuple[str,str]:
+# Segundos antes de reintentar cargar un tokenizer que falló (p. ej. sin red
+# para descargar el vocabulario); mientras tanto se recorta por caracteres
+ENCODING_RETRY_SECONDS = 60
+
+# Tokenizers cargados por modelo y último intento fallido por modelo
+_encodings: Dict[str, "tiktoken.Encoding"] = {}
+_encoding_failures: Dict[str, float] = {}
+
+
+def _get_encoding(model: str) -> Optional["tiktoken.Encoding"]:
+    """
+    Tokenizer del modelo, cargado una sola vez por proceso. Si la carga falla
+    devuelve None sin recordar el fallo de forma permanente: se reintenta
+    pasados ENCODING_RETRY_SECONDS.
+    """
+    encoding = _encodings.get(model)
+    if encoding is not None or not TIKTOKEN_AVAILABLE:
+        return encoding
+
+    failed_at = _encoding_failures.get(model)
+    if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_SECONDS:
+        return None
+
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # Modelo desconocido o sin acceso para descargar el vocabulario
+        logger.warning(f"No se pudo cargar el tokenizer de {model}: {e}")
+        _encoding_failures[model] = time.monotonic()
+        return None
+
+    _encodings[model] = encoding
+    _encoding_failures.pop(model, None)
+    return encoding
+
+
+def warm_up_tokenizer() -> None:
+    """
+    Carga el tokenizer del modelo configurado. Se llama al arrancar (en un hilo)
+    para que la primera petición no pague la lectura o descarga del vocabulario
+    dentro del event loop.
+    """
+    _get_encoding(get_settings().llm_model)
+
+
+def truncate_to_token_budget(text: str, max_tokens: int) -> str:
+    """
+    Recorta el texto a `max_tokens` tokens del modelo configurado, cortando
+    en límites de token (lo que factura la API). Sin tokenizer, recorta por
+    caracteres con una estimación de CHARS_PER_TOKEN.
+    """
+    encoding = _get_encoding(get_settings().llm_model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+@lru_cache(maxsize=64)
+def build_system_prompt(doc_type: Optional[str] = None) -> str:
+    """
+    System prompt de extracción. Depende solo de la configuración (tipo de
+    documento), no del texto, así que se construye una vez por tipo y se reutiliza.
+    
+    Args:
+        doc_type: Tipo de documento esperado (ej. "DNI"); None si no se conoce
+        
+    Returns:
+        str: System prompt
+    """
+    if not doc_type:
+        return EXTRACTION_SYSTEM_PROMPT
+    return f"{EXTRACTION_SYSTEM_PROMPT}. El documento esperado es de tipo: {doc_type}"
+
+
+def build_user_prompt(raw_text: str) -> str:
+    """
+    User prompt de extracción con el texto OCR del documento, recortado
+    a `llm_input_token_budget` tokens.
+    
+    Args:
+        raw_text: Texto extraído del documento
+        
+    Returns:
+        str: User prompt
+    """
+    budget = get_settings().llm_input_token_budget
+    return EXTRACTION_USER_PROMPT.format(cleaned_text=truncate_to_token_budget(raw_text, budget))
+
+
+def generate_extraction_prompts(state: PipelineState, doc_type: Optional[str] = None) -> tuple[str,str]:
     """
     Genera los prompts para extracción usando el estado actual.
     
     Args:
         state: Estado del pipeline con el texto extraído
+        doc_type: Tipo de documento esperado (opcional)
         
     Returns:
         tuple: (system_prompt, user_prompt)
     """
-    system_prompt = EXTRACTION_SYSTEM_PROMPT
-    
     # Verificar que el texto esté disponible
     if not state.processing_data.raw_text:
         raise ValueError("No hay texto extraído disponible en el estado")
+
+    return build_system_prompt(doc_type), build_user_prompt(state.processing_data.raw_text)
+
+
+def generate_multi_extraction_prompts(texts: list[str]) -> tuple[str, str]:
+    """
+    Genera los prompts para extraer varios documentos en una sola llamada.
+    El system prompt y las instrucciones se pagan una vez por llamada, y cada
+    texto se recorta a `llm_input_token_budget` tokens.
     
-    user_prompt = EXTRACTION_USER_PROMPT.format(
-        cleaned_text=state.processing_data.raw_text
+    Args:
+        texts: Textos OCR de cada documento
+        
+    Returns:
+        tuple: (system_prompt, user_prompt)
+    """
+    if not texts:
+        raise ValueError("No hay textos para extraer")
+
+    budget = get_settings().llm_input_token_budget
+    documents = "\n\n".join(
+        f"[{index}]:\n{truncate_to_token_budget(text, budget)}" for index, text in enumerate(texts)
     )
+    user_prompt = EXTRACTION_MULTI_USER_PROMPT.format(documents=documents)
 
-    return system_prompt, user_prompt
+    return build_system_prompt(), user_prompt
@@ -0,0 +1,47 @@
+from typing import Dict, Any
+from pydantic import BaseModel, Field
+
+# === MODELOS DEL RESULTADO PARA EL FRONTEND ===
+
+class ResultMetrics(BaseModel):
+    """Métricas de procesamiento mostradas en el frontend."""
+    ocr_confidence: float = Field(default=0.0, description="Confianza del OCR")
+    processing_time: float = Field(default=0.0, description="Tiempo total de procesamiento en segundos")
+    text_length: int = Field(default=0, description="Caracteres extraídos por el OCR")
+    ocr_method: str = Field(default="Google Vision API", description="Motor OCR utilizado")
+
+
+class EnhancedResult(BaseModel):
+    """Resultado de un job tal como lo devuelve /result."""
+    extracted_data: Dict[str, Any] = Field(default_factory=dict, description="Datos extraídos + texto OCR")
+    processing_metrics: ResultMetrics = Field(default_factory=ResultMetrics)
+    raw_result: Dict[str, Any] = Field(default_factory=dict, description="Resultado completo del pipeline (debugging)")
+
+    @classmethod
+    def from_pipeline_result(cls, result: Dict[str, Any]) -> 'EnhancedResult':
+        """
+        Construye el resultado tipado a partir de la salida de Pipeline.process.
+
+        Args:
+            result: Resultado exitoso del pipeline
+
+        Returns:
+            EnhancedResult listo para serializar
+        """
+        ocr_stats = result.get("debug_info", {}).get("ocr_stats", {})
+        time_metrics = result.get("processing_control", {}).get("time_metrics", {})
+        raw_text = result.get("processing_data", {}).get("raw_text", "")
+
+        return cls(
+            extracted_data={
+                **result.get("extracted_data", {}),
+                "texto_extraido": raw_text
+            },
+            processing_metrics=ResultMetrics(
+                ocr_confidence=round(ocr_stats.get("ocr_confidence", 0), 1),
+                processing_time=round(time_metrics.get("total_time", 0), 1),
+                text_length=len(raw_text),
+                ocr_method=ocr_stats.get("ocr_method", "Google Vision API")
+            ),
+            raw_result=result  # Mantener resultado completo para debugging
+        )
@@ -4,11 +4,22 @@ Pydantic Settings V2 compatible con LangGraph.
 Solo soporta imágenes (JPG, PNG).
 """
 
-from typing import Dict, List
+import logging
+import math
+import os
+import shutil
+from functools import cached_property, lru_cache
+from typing import Dict, FrozenSet, List
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
+# Tamaño mínimo de /dev/shm para usarlo como TEMP_DIR: Docker lo limita a
+# 64 MiB por contenedor, menos que un lote de /process_batch con imágenes grandes
+MIN_SHM_BYTES = 256 * 1024 * 1024
+
 class Settings(BaseSettings):
     """Configuración principal del sistema usando Pydantic V2."""
     
@@ -27,11 +38,48 @@ class Settings(BaseSettings):
     
     # === CONFIGURACIÓN DE ARCHIVOS ===
     max_image_size_mb: int = Field(default=10, gt=0, le=50, description="Tamaño máximo de imagen en MB")
-    temp_dir: str = Field(default="./temp", description="Directorio temporal")
+    temp_dir: str = Field(default="/dev/shm/smartid", description="Directorio temporal (tmpfs por defecto)")
+    
+    # === CONFIGURACIÓN DE REDIS (JOBS) ===
+    redis_url: str = Field(default="redis://localhost:6379/0", description="URL de conexión a Redis")
+    job_ttl_seconds: int = Field(default=3600, ge=60, description="Tiempo de vida de los jobs en Redis (segundos)")
+    document_cache_ttl_seconds: int = Field(default=86400, ge=0, description="Tiempo de vida del cache de resultados por SHA256 del documento (0 = deshabilitado)")
+    max_concurrent_pipeline_jobs: int = Field(
+        default_factory=lambda: (os.cpu_count() or 1) * 2,
+        ge=1,
+        description="Máximo de jobs del pipeline ejecutándose a la vez por worker"
+    )
+    worker_job_timeout: int = Field(default=300, ge=30, description="Tiempo máximo de un job en el worker arq (segundos)")
+    worker_poll_delay: float = Field(default=0.1, gt=0.0, le=5.0, description="Intervalo de sondeo de la cola arq (segundos)")
+    batch_max_files: int = Field(default=20, ge=1, description="Máximo de archivos por petición a /process_batch")
+    batch_max_concurrency: int = Field(
+        default=4,
+        ge=1,
+        le=32,
+        description="Documentos de un mismo lote procesándose a la vez (acota RPM de Vision/OpenAI)"
+    )
+    openai_batch_poll_seconds: int = Field(
+        default=120,
+        ge=10,
+        description="Intervalo entre consultas de un lote diferido al Batch API de OpenAI (segundos)"
+    )
     
     # === CONFIGURACIÓN DE LLM ===
     llm_model: str = Field(default="gpt-4o-mini", description="Modelo OpenAI a usar")
     llm_temperature: float = Field(default=0.1, ge=0.0, le=2.0, description="Temperatura del modelo")
+    llm_input_token_budget: int = Field(default=2000, ge=100, description="Tokens máximos del texto OCR enviado al LLM por documento")
+    llm_request_timeout: float = Field(default=30.0, gt=0.0, description="Timeout por petición a OpenAI (segundos)")
+    llm_max_retries: int = Field(default=0, ge=0, le=10, description="Reintentos internos del cliente OpenAI (los transitorios ya se reintentan con backoff)")
+    llm_retry_attempts: int = Field(default=6, ge=1, le=20, description="Intentos máximos ante rate limit, timeout o error de conexión de OpenAI")
+    llm_retry_max_wait: float = Field(default=30.0, gt=0.0, description="Espera máxima entre reintentos a OpenAI (segundos)")
+    llm_max_connections: int = Field(default=32, ge=1, description="Conexiones HTTP máximas del cliente OpenAI")
+    llm_max_keepalive_connections: int = Field(default=16, ge=0, description="Conexiones keep-alive del cliente OpenAI")
+    llm_documents_per_request: int = Field(
+        default=1,
+        ge=1,
+        le=20,
+        description="Documentos de un lote extraídos en una misma llamada al LLM (1 = una llamada por documento)"
+    )
     max_retries: int = Field(default=3, ge=1, le=10, description="Máximo reintentos")
     request_timeout: int = Field(default=120, ge=30, le=300, description="Timeout en segundos")
     
@@ -49,13 +97,18 @@ class Settings(BaseSettings):
     debug_mode: bool = Field(default=False, description="Modo debug")
     save_intermediate_results: bool = Field(default=False, description="Guardar resultados intermedios")
     cache_enabled: bool = Field(default=True, description="Cache habilitado")
+    ocr_cache_dir: str = Field(default="./cache/ocr", description="Directorio de la cache OCR en disco (vacío = deshabilitada)")
+    llm_cache_dir: str = Field(default="./cache/llm", description="Directorio de la cache de extracciones LLM en disco (vacío = deshabilitada)")
+    cache_ttl_seconds: int = Field(default=86400, ge=0, description="Tiempo de vida de las entradas de la cache en disco, que contienen datos personales (0 = sin expiración)")
     
     # === CONFIGURACIÓN OCR - GOOGLE VISION ===
     ocr_engine: str = Field(default="google_vision", description="Motor OCR: google_vision")
     ocr_language: str = Field(default="es", description="Idioma OCR (es para español)")
     ocr_confidence_threshold: float = Field(default=60.0, ge=0.0, le=100.0, description="Umbral confianza OCR")
-    ocr_preprocess_images: bool = Field(default=True, description="Aplicar preprocesamiento de imagen")
+    ocr_preprocess_images: bool = Field(default=True, description="Reducir y re-codificar como JPEG las imágenes más grandes que ocr_max_image_side antes de enviarlas a Google Vision")
     ocr_dpi: int = Field(default=300, ge=150, le=600, description="DPI para conversión PDF a imagen")
+    ocr_max_image_side: int = Field(default=2048, ge=512, le=8192, description="Lado máximo (px) de la imagen enviada a Google Vision")
+    ocr_concurrency_limit: int = Field(default=8, ge=1, le=64, description="Máximo de llamadas simultáneas a Google Vision por proceso")
     
     # === CONFIGURACIÓN GOOGLE VISION ===
     google_credentials_path: str = Field(default="", description="Ruta al archivo JSON de credenciales de Google")
@@ -63,7 +116,6 @@ class Settings(BaseSettings):
     google_vision_max_retries: int = Field(default=3, ge=1, le=5, description="Máximo reintentos para Google Vision")
     
     # === CONFIGURACIÓN DE ARCHIVOS DE IMAGEN ===
-    max_image_size_mb: int = Field(default=10, gt=0, le=50, description="Tamaño máximo imagen en MB")
     supported_image_formats: List[str] = Field(default=[".jpg", ".jpeg", ".png", ".tiff", ".tif", ".bmp"], description="Formatos de imagen soportados")
     
     openai_pricing: Dict[str, Dict[str, float]] = Field(
@@ -83,6 +135,19 @@ class Settings(BaseSettings):
         extra="ignore"
     )
     
+    @property
+    def batch_job_timeout(self) -> int:
+        """
+        Timeout de las tareas de lote del worker: un `worker_job_timeout` por cada
+        tanda de `batch_max_concurrency` documentos de un lote máximo.
+        """
+        return self.worker_job_timeout * math.ceil(self.batch_max_files / self.batch_max_concurrency)
+
+    @cached_property
+    def supported_image_formats_set(self) -> FrozenSet[str]:
+        """Formatos de imagen soportados como frozenset (búsqueda O(1))."""
+        return frozenset(ext.lower() for ext in self.supported_image_formats)
+    
     # === VALIDATORS ===
     
     @field_validator('openai_api_key', mode='before')
@@ -95,8 +160,20 @@ class Settings(BaseSettings):
     @field_validator('temp_dir', mode='before')
     @classmethod
     def validate_temp_dir(cls, v: str) -> str:
-        """Crear directorio temporal si no existe."""
+        """
+        Crear directorio temporal si no existe. Usa ./temp (disco) si no hay
+        tmpfs o si /dev/shm es demasiado pequeño (por defecto en Docker).
+        """
         path = Path(v)
+        if path.is_relative_to("/dev/shm"):
+            shm_bytes = shutil.disk_usage("/dev/shm").total if Path("/dev/shm").is_dir() else 0
+            if shm_bytes < MIN_SHM_BYTES:
+                if shm_bytes:
+                    logger.warning(
+                        f"/dev/shm tiene {shm_bytes // (1024 * 1024)} MiB (< {MIN_SHM_BYTES // (1024 * 1024)} MiB), "
+                        "se usa ./temp como directorio temporal"
+                    )
+                path = Path("./temp")
         path.mkdir(parents=True, exist_ok=True)
         return str(path)
 
@@ -109,5 +186,10 @@ class Settings(BaseSettings):
             raise ValueError(f"Log level debe ser uno de: {valid_levels}")
         return v.upper()
 
-# Instancia global de configuración
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Instancia única de configuración, creada en el primer uso (no al importar).
+    En tests se puede reiniciar con get_settings.cache_clear().
+    """
+    return Settings()
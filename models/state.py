@@ -1,6 +1,7 @@
+from dataclasses import dataclass, field
 from typing import Dict, Any, Optional, List
-from pydantic import BaseModel, Field, ConfigDict, field_validator
-from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict
+import time
 
 # === MODELOS AUXILIARES ===
 
@@ -17,12 +18,22 @@ class DocumentInfo(BaseModel):
     file_path: str = Field(default="", description="Ruta del archivo")
     filename: str = Field(default="", description="Nombre del archivo")
     file_size: int = Field(default=0, description="Tamaño del archivo en bytes")
+    content_sha256: str = Field(default="", description="SHA256 del contenido (calculado al subir el archivo)")
 
 
-class ProcessingData(BaseModel):
-    """Datos de procesamiento de la imagen."""
-    raw_text: Optional[str] = Field(default=None, description="Texto extraído de la imagen")
-    ocr_confidence: float = Field(default=0.0, ge=0.0, le=100.0, description="Confianza promedio del OCR")
+@dataclass(slots=True)
+class ProcessingData:
+    """
+    Datos de procesamiento de la imagen.
+    Dataclass con __slots__: los nodos lo mutan en el camino crítico.
+    """
+    raw_text: Optional[str] = None  # Texto extraído de la imagen
+    ocr_confidence: float = 0.0  # Confianza promedio del OCR (0-100)
+
+    def __post_init__(self) -> None:
+        # Mismo rango que validaba el modelo Pydantic (ge=0.0, le=100.0)
+        if not 0.0 <= self.ocr_confidence <= 100.0:
+            raise ValueError(f"ocr_confidence debe estar entre 0 y 100: {self.ocr_confidence}")
 
 
 class TextContent(BaseModel):
@@ -30,17 +41,26 @@ class TextContent(BaseModel):
     raw_text: Optional[str] = Field(default=None, description="Texto crudo extraído")
     cleaned_text: Optional[str] = Field(default=None, description="Texto limpio")
 
-class ProcessingControl(BaseModel):
-    """Control de flujo del procesamiento."""
-    processing_stage: str = Field(default="ingestion", description="Etapa actual de procesamiento")
-    status: str = Field(default="PROCESSING", description="Estado del procesamiento")
+@dataclass(slots=True)
+class ProcessingControl:
+    """
+    Control de flujo del procesamiento.
+    Dataclass con __slots__: update_stage/add_error lo mutan en cada nodo.
+    """
+    processing_stage: str = "ingestion"  # Etapa actual de procesamiento
+    status: str = "PROCESSING"  # Estado del procesamiento
 
-class LoggingData(BaseModel):
-    """Datos de logging y debug."""
-    messages: List[str] = Field(default_factory=list, description="Mensajes del proceso")
-    errors: List[str] = Field(default_factory=list, description="Errores encontrados")
-    warnings: List[str] = Field(default_factory=list, description="Warnings generados")
-    debug_info: Dict[str, Any] = Field(default_factory=dict, description="Información de debug")
+@dataclass(slots=True)
+class LoggingData:
+    """
+    Datos de logging y debug.
+    Dataclass con __slots__ (no Pydantic): se muta en cada add_message/add_error,
+    así que se evita la validación y el __dict__ por instancia.
+    """
+    messages: List[str] = field(default_factory=list)  # Mensajes del proceso
+    errors: List[str] = field(default_factory=list)  # Errores encontrados
+    warnings: List[str] = field(default_factory=list)  # Warnings generados
+    debug_info: Dict[str, Any] = field(default_factory=dict)  # Información de debug
 
 
 # === MODELO PRINCIPAL ===
@@ -52,10 +72,8 @@ class PipelineState(BaseModel):
     """
     
     model_config = ConfigDict(
-        # Permite campos extra para flexibilidad
-        extra='allow',
-        # Valida assignment para mantener tipos
-        validate_assignment=True,
+        # Ignora campos desconocidos (la validación se hace solo al construir el estado)
+        extra='ignore',
         # Permite usar enums por valor
         use_enum_values=True,
         # Serializa por alias si se definen
@@ -107,20 +125,20 @@ class PipelineState(BaseModel):
     
     def add_message(self, message: str) -> 'PipelineState':
         """Agregar mensaje al estado."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = time.strftime("%H:%M:%S")
         self.logging.messages.append(f"[{timestamp}] {message}")
         return self
     
     def add_error(self, error: str) -> 'PipelineState':
         """Agregar error al estado."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = time.strftime("%H:%M:%S")
         self.logging.errors.append(f"[{timestamp}] {error}")
         self.processing_control.status = "FAILED"
         return self
     
     def add_warning(self, warning: str) -> 'PipelineState':
         """Agregar warning al estado."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = time.strftime("%H:%M:%S")
         self.logging.warnings.append(f"[{timestamp}] {warning}")
         return self
     
@@ -135,6 +153,23 @@ class PipelineState(BaseModel):
         
         return self
     
+    def apply_updates(
+        self,
+        messages: Optional[List[str]] = None,
+        debug_info: Optional[Dict[str, Any]] = None
+    ) -> 'PipelineState':
+        """
+        Aplica de una vez los cambios acumulados por un nodo: mensajes
+        (con una sola marca de tiempo) y entradas de debug_info.
+        """
+        logging_data = self.logging
+        if messages:
+            timestamp = time.strftime("%H:%M:%S")
+            logging_data.messages.extend(f"[{timestamp}] {message}" for message in messages)
+        if debug_info:
+            logging_data.debug_info.update(debug_info)
+        return self
+
     def update_debug_info(self, updates: dict) -> None:
         """
         Actualiza el diccionario debug_info con los valores proporcionados.
@@ -142,6 +177,4 @@ class PipelineState(BaseModel):
         Args:
             updates (dict): Diccionario con las claves y valores a actualizar.
         """
-        if not hasattr(self, "debug_info") or not isinstance(self.debug_info, dict):
-            self.debug_info = {}
-        self.debug_info.update(updates)     
+        self.logging.debug_info.update(updates)     
@@ -5,11 +5,4 @@ from .llm import llm_node
 import logging
 
 logger = logging.getLogger(__name__)
-logger.info(f"Nodos del pipeline inicializados")
-
-handler = logging.StreamHandler()
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
\ No newline at end of file
+logger.info("Nodos del pipeline inicializados")
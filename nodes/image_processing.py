@@ -1,16 +1,97 @@
+import asyncio
 import logging
+import os
 import time
 from pathlib import Path
+from typing import List, Optional
 
 from models.state import PipelineState
-from models.settings import settings
-from utils.image_utils import is_image_file, validate_image_dependencies
-from utils.ocr_utils import validate_tesseract_installation, extract_text_with_google_vision
+from models.settings import get_settings
+from utils.cache_utils import cache_get, cache_set, get_ocr_cache
+from utils.image_utils import image_sha256, is_image_file, validate_image_dependencies
+from utils.ocr_utils import (
+    validate_tesseract_installation,
+    extract_text_with_google_vision,
+    extract_text_batch_with_google_vision,
+)
 
 logger = logging.getLogger("ImageProcessing")
 
+# Motor incluido en la clave de cache para no mezclar resultados de distintos OCR
+OCR_ENGINE = "google_vision"
 
-def image_processing_node(state: PipelineState) -> PipelineState:
+
+def _extract_text_cached(file_path: str, content_sha256: str = "") -> str:
+    """
+    Extrae el texto con Google Vision consultando antes la cache OCR
+    (clave: motor + SHA256 de la imagen). Se ejecuta en un hilo.
+    Si el hash ya se calculó al subir el archivo no se vuelve a leer la imagen.
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return extract_text_with_google_vision(file_path)
+
+    key = f"{OCR_ENGINE}:{content_sha256 or image_sha256(file_path)}"
+    cached_text = cache_get(cache, key)
+    if cached_text is not None:
+        logger.info("Texto OCR obtenido de cache")
+        return cached_text
+
+    raw_text = extract_text_with_google_vision(file_path)
+    if raw_text and raw_text.strip():
+        cache_set(cache, key, raw_text)
+    return raw_text
+
+
+def prefetch_ocr_texts(
+    file_paths: List[str],
+    content_sha256s: Optional[List[Optional[str]]] = None
+) -> List[Optional[str]]:
+    """
+    OCR de varias imágenes en peticiones por lotes a Google Vision,
+    consultando antes la cache OCR. Se ejecuta en un hilo.
+    Los hashes ya calculados al subir (`content_sha256s`) evitan releer las imágenes.
+
+    Returns:
+        Texto de cada imagen en el mismo orden (None si no se pudo obtener;
+        el nodo hará el OCR individual de esa imagen).
+    """
+    texts: List[Optional[str]] = [None] * len(file_paths)
+    cache = get_ocr_cache()
+    keys: List[Optional[str]] = [None] * len(file_paths)
+
+    if cache is not None:
+        for i, path in enumerate(file_paths):
+            known_sha256 = content_sha256s[i] if content_sha256s else None
+            try:
+                keys[i] = f"{OCR_ENGINE}:{known_sha256 or image_sha256(path)}"
+            except OSError:
+                continue
+            texts[i] = cache_get(cache, keys[i])
+
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if not missing:
+        return texts
+
+    vision_ok, _ = validate_tesseract_installation()
+    if not vision_ok:
+        return texts
+
+    try:
+        batch_texts = extract_text_batch_with_google_vision([file_paths[i] for i in missing])
+    except Exception as e:
+        logger.warning(f"OCR por lotes falló, se usará OCR individual: {e}")
+        return texts
+
+    for i, text in zip(missing, batch_texts):
+        texts[i] = text
+        if text and text.strip() and keys[i] is not None:
+            cache_set(cache, keys[i], text)
+
+    return texts
+
+
+async def image_processing_node(state: PipelineState) -> PipelineState:
     """
     Nodo único de procesamiento de imágenes.
     
@@ -28,6 +109,7 @@ def image_processing_node(state: PipelineState) -> PipelineState:
     
     logger.info("Iniciando procesamiento de imagen")
     state = state.update_stage('ImageProcessing')
+    processing_data = state.processing_data
     
     start_time = time.time()
     
@@ -46,46 +128,57 @@ def image_processing_node(state: PipelineState) -> PipelineState:
             return state.add_error(f"Dependencias de imagen faltantes: {str(e)}")
         
         # === VALIDACIÓN DEL ARCHIVO ===
-        file_path = Path(state.document_info.file_path)
-        
-        if not file_path.exists():
-            return state.add_error(f"Archivo no encontrado: {file_path}")
+        document_info = state.document_info
+        file_path = Path(document_info.file_path)
         
         if not is_image_file(file_path):
             return state.add_error(f"El archivo no es una imagen válida: {file_path.suffix}")
         
-        # Verificar tamaño
-        file_size_bytes = file_path.stat().st_size
+        # Verificar tamaño: el upload ya lo conoce; si no, un único stat
+        file_size_bytes = document_info.file_size
+        if not file_size_bytes:
+            try:
+                file_size_bytes = os.stat(file_path).st_size
+            except FileNotFoundError:
+                return state.add_error(f"Archivo no encontrado: {file_path}")
         file_size_mb = file_size_bytes / (1024 * 1024)
-        max_size = getattr(settings, 'max_image_size_mb', 10)
+        max_size = get_settings().max_image_size_mb
         
         if file_size_mb > max_size:
             return state.add_error(f"Imagen demasiado grande: {file_size_mb:.1f}MB > {max_size}MB")
         
         logger.info(f"Imagen válida: {file_path.name} ({file_size_mb:.2f}MB)")
-        state = state.add_message(f"Imagen válida: {file_size_mb:.2f}MB")
+        # Los mensajes se acumulan y se aplican al estado una sola vez
+        messages = [f"Imagen válida: {file_size_mb:.2f}MB"]
         
         # === EXTRACCIÓN DE TEXTO CON GOOGLE VISION ===
         logger.info("Extrayendo texto con Google Vision API...")
         
         try:
-            raw_text = extract_text_with_google_vision(str(file_path))
+            if processing_data.raw_text is not None:
+                # Texto ya obtenido por el OCR por lotes (Pipeline.process_many)
+                raw_text = processing_data.raw_text
+            else:
+                # La llamada a Vision es bloqueante: se ejecuta en un hilo para que
+                # otros documentos avancen (p. ej. en el LLM) mientras se espera
+                raw_text = await asyncio.to_thread(
+                    _extract_text_cached, str(file_path), document_info.content_sha256
+                )
             
             if not raw_text or not raw_text.strip():
                 logger.warning("Google Vision no detectó texto en la imagen")
-                return state.add_error("No se detectó texto en la imagen")
+                return state.apply_updates(messages).add_error("No se detectó texto en la imagen")
             
             # Guardar texto crudo en el estado
-            state.processing_data.raw_text = raw_text.strip()
+            processing_data.raw_text = raw_text.strip()
             
             elapsed_time = time.time() - start_time
             char_count = len(raw_text)
             
             logger.info(f"Texto extraído: {char_count} caracteres en {elapsed_time:.2f}s")
-            state = state.add_message(f"Texto extraído: {char_count} caracteres")
+            messages.append(f"Texto extraído: {char_count} caracteres")
             
-            # Actualizar debug info
-            state.logging.debug_info.update({
+            return state.apply_updates(messages, debug_info={
                 "image_processing_stats": {
                     "file_size_mb": file_size_mb,
                     "processing_time_seconds": elapsed_time,
@@ -95,12 +188,10 @@ def image_processing_node(state: PipelineState) -> PipelineState:
                 }
             })
             
-            return state
-            
         except Exception as e:
             error_msg = f"Error en Google Vision API: {str(e)}"
             logger.error(error_msg)
-            return state.add_error(error_msg)
+            return state.apply_updates(messages).add_error(error_msg)
     
     except Exception as e:
         error_msg = f"Error crítico en procesamiento de imagen: {str(e)}"
@@ -1,22 +1,61 @@
+import asyncio
+import hashlib
 import logging
-import json
-from openai import OpenAI
-from models.settings import settings
+from models.settings import get_settings
 from models.state import PipelineState
 from models.prompts import generate_extraction_prompts
+from utils.cache_utils import cache_get, cache_set, get_llm_cache
+from openai import RateLimitError
+from utils.llm_utils import EXTRACTION_RESPONSE_FORMAT, acall_openai, get_async_openai_client, parse_extraction_content
 
-def llm_node(state: PipelineState) -> PipelineState:
+def _llm_cache_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """Clave del cache de extracciones: mismo modelo + mismos prompts => mismo resultado."""
+    return hashlib.sha256(f"{model}\n{system_prompt}\n{user_prompt}".encode()).hexdigest()
+
+
+async def llm_node(state: PipelineState) -> PipelineState:
     logger = logging.getLogger("Nodo 6")
+    settings = get_settings()
     
+    processing_control = state.processing_control
+
     # Verificar si el estado ya está marcado como FAILED
-    if state.processing_control.status == "FAILED":
+    if processing_control.status == "FAILED":
         logger.error("Estado marcado como FAILED, saltando procesamiento LLM")
         return state
     
     state = state.update_stage("llm_processing")
 
+    # Datos ya extraídos en una llamada multi-documento (Pipeline.process_many)
+    extracted_data = state.extracted_data
+    if extracted_data:
+        # Guardar la extracción con la misma clave que una llamada individual,
+        # para que el documento se sirva del cache si se vuelve a procesar solo
+        cache = get_llm_cache()
+        if cache is not None:
+            try:
+                system_prompt, user_prompt = generate_extraction_prompts(state)
+                cache_key = _llm_cache_key(settings.llm_model, system_prompt, user_prompt)
+                await asyncio.to_thread(cache_set, cache, cache_key, extracted_data)
+            except Exception as e:
+                logger.warning(f"No se pudo guardar la extracción en cache: {e}")
+
+        processing_control.status = "COMPLETED"
+        return state.apply_updates(
+            [f"Extracción completada: {len(extracted_data)} campos extraídos"],
+            debug_info={
+                "llm_stats": {
+                    "model_used": settings.llm_model,
+                    "tokens_used": state.metrics.tokens_used,
+                    "fields_extracted": len(extracted_data),
+                    "extraction_successful": True,
+                    "multi_document": True
+                }
+            }
+        )
+
     try:
-        client = OpenAI(api_key=settings.openai_api_key)
+        client = get_async_openai_client()
     except Exception as e:
         return state.add_error(f"Error inicializando cliente OpenAI: {str(e)}")
     
@@ -24,55 +63,69 @@ def llm_node(state: PipelineState) -> PipelineState:
         # CORREGIDO: Pasar state en lugar de cleaned_text
         system_prompt, user_prompt = generate_extraction_prompts(state)
 
-        response = client.chat.completions.create(
-            model=settings.llm_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=1500,
-            temperature=settings.llm_temperature,
-            top_p=0.9
-        )
+        # Cache de extracciones: mismo modelo + mismos prompts => mismo resultado
+        cache = get_llm_cache()
+        cache_key = _llm_cache_key(settings.llm_model, system_prompt, user_prompt)
+        result = await asyncio.to_thread(cache_get, cache, cache_key) if cache is not None else None
+        cache_hit = result is not None
 
-        tokens_used = response.usage.total_tokens if response.usage else 0
-        content = response.choices[0].message.content.strip()
+        if cache_hit:
+            logger.info("Extracción obtenida de cache, sin llamar a OpenAI")
+            tokens_used = 0
+            content = ""
+        else:
+            response = await acall_openai(
+                client,
+                model=settings.llm_model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=1500,
+                temperature=settings.llm_temperature,
+                top_p=0.9,
+                response_format=EXTRACTION_RESPONSE_FORMAT
+            )
 
-        # Limpiar formato JSON
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.endswith("```"):
-            content = content[:-3]
+            tokens_used = response.usage.total_tokens if response.usage else 0
+            content = response.choices[0].message.content
 
-        result = json.loads(content.strip())
+            result = parse_extraction_content(content)
 
-        if not isinstance(result, dict):
-            raise ValueError("Respuesta de OpenAI no es un objeto JSON válido")
+            if cache is not None:
+                await asyncio.to_thread(cache_set, cache, cache_key, result)
 
         # CORREGIDO: Actualizar el estado con los datos extraídos
         state.extracted_data = result
         state.update_metrics(tokens=tokens_used)
-        state.processing_control.status = "COMPLETED"
-        
-        # Actualizar debug info con estadísticas de LLM
-        state.logging.debug_info.update({
-            "llm_stats": {
-                "model_used": settings.llm_model,
-                "tokens_used": tokens_used,
-                "temperature": settings.llm_temperature,
-                "max_tokens": 1500,
-                "top_p": 0.9,
-                "fields_extracted": len(result),
-                "response_length": len(content),
-                "extraction_successful": True,
-                "prompt_system_length": len(system_prompt),
-                "prompt_user_length": len(user_prompt)
-            }
-        })
+        processing_control.status = "COMPLETED"
         
         logger.info(f"Extracción exitosa: {len(result)} campos, {tokens_used} tokens")
-        return state.add_message(f"Extracción completada: {len(result)} campos extraídos")
+
+        # Mensaje y estadísticas de LLM aplicados en un solo paso
+        return state.apply_updates(
+            [f"Extracción completada: {len(result)} campos extraídos"],
+            debug_info={
+                "llm_stats": {
+                    "model_used": settings.llm_model,
+                    "tokens_used": tokens_used,
+                    "temperature": settings.llm_temperature,
+                    "max_tokens": 1500,
+                    "top_p": 0.9,
+                    "fields_extracted": len(result),
+                    "response_length": len(content),
+                    "extraction_successful": True,
+                    "cache_hit": cache_hit,
+                    "prompt_system_length": len(system_prompt),
+                    "prompt_user_length": len(user_prompt)
+                }
+            }
+        )
         
+    except RateLimitError as e:
+        logger.error(f"Rate limit de OpenAI persistente tras reintentos: {str(e)}")
+        return state.add_error(f"Rate limit de OpenAI tras {settings.llm_retry_attempts} intentos: {str(e)}")
+
     except Exception as e:
         logger.error(f"Error en extracción LLM: {str(e)}")
         return state.add_error(f"Error en extracción LLM: {str(e)}")
\ No newline at end of file
@@ -1,23 +1,39 @@
 # Pipeline principal de procesamiento - Simplificado para solo imágenes
+import asyncio
 import logging
-import traceback
-from typing import Dict, Any
+import uuid
+from contextlib import nullcontext
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
 
+from models.settings import get_settings
 from models.state import PipelineState, DocumentInfo
-from nodes.image_processing import image_processing_node
+from nodes.image_processing import image_processing_node, prefetch_ocr_texts
 from nodes.llm import llm_node
+from utils.llm_utils import (
+    aperform_openai_extraction_multi,
+    fetch_openai_batch_results,
+    get_async_openai_client,
+    perform_openai_batch_extraction,
+)
 
 logger = logging.getLogger("Pipeline")
 
 
 class Pipeline:
     
-    def __init__(self):
+    def __init__(self, enable_checkpoint: bool = False):
+        """
+        Args:
+            enable_checkpoint: Guardar el estado tras cada nodo (MemorySaver) para
+                flujos que necesiten reanudarse. Desactivado por defecto: cada
+                ejecución es única y el checkpoint solo añade copias del estado.
+        """
         self.graph = None
         self.app = None
+        self.enable_checkpoint = enable_checkpoint
         self.initialize_pipeline()
     
     def initialize_pipeline(self):
@@ -34,24 +50,37 @@ class Pipeline:
             workflow.add_edge("image_processing", "llm")
             workflow.add_edge("llm", END)
 
-            # Compilar grafo con memoria
-            memory = MemorySaver()
-            self.app = workflow.compile(checkpointer=memory)
+            # Compilar grafo (con memoria solo si se pidió checkpoint)
+            checkpointer = MemorySaver() if self.enable_checkpoint else None
+            self.app = workflow.compile(checkpointer=checkpointer)
             
             logger.info("Pipeline inicializado correctamente")
         
         except Exception as e:
-            logger.error(f"Error inicializando pipeline: {e}")
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error inicializando pipeline: {e}")
             raise
 
-    async def process(self, file_path: str, filename: str) -> Dict[str, Any]:
+    async def process(
+        self,
+        file_path: str,
+        filename: str,
+        raw_text: Optional[str] = None,
+        extracted_data: Optional[Dict[str, Any]] = None,
+        tokens_used: int = 0,
+        document_hash: Optional[str] = None,
+        file_size: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Procesa una imagen a través del pipeline.
 
         Args:
             file_path (str): Ruta del archivo de imagen a procesar.
             filename (str): Nombre del archivo de imagen.
+            raw_text (Optional[str]): Texto OCR ya obtenido (el nodo de imagen no llama a Vision).
+            extracted_data (Optional[Dict]): Datos ya extraídos (el nodo LLM no llama a OpenAI).
+            tokens_used (int): Tokens atribuidos a la extracción ya realizada.
+            document_hash (Optional[str]): SHA256 calculado al subir (evita volver a hashear la imagen).
+            file_size (Optional[int]): Tamaño en bytes conocido al subir (evita el stat del archivo).
 
         Returns:
             Dict[str, Any]: Resultado del procesamiento del pipeline.
@@ -60,13 +89,21 @@ class Pipeline:
             logger.info(f"Iniciando procesamiento de: {filename}")
             
             # === CREAR ESTADO INICIAL ===
-            initial_state = self.create_initial_state(file_path, filename)
+            initial_state = self.create_initial_state(file_path, filename, raw_text)
+            if document_hash:
+                initial_state.document_info.content_sha256 = document_hash
+            if file_size:
+                initial_state.document_info.file_size = file_size
+            if extracted_data:
+                initial_state.extracted_data = extracted_data
+                # Tokens y costo igual que en llm_node
+                initial_state.update_metrics(tokens=tokens_used)
             logger.info("Ejecutando pipeline")
             
-            # Usar un thread_id único para el checkpointer
-            import uuid
-            thread_id = str(uuid.uuid4())
-            config = {"configurable": {"thread_id": thread_id}}
+            # El checkpointer necesita un thread_id único por ejecución
+            config = None
+            if self.enable_checkpoint:
+                config = {"configurable": {"thread_id": str(uuid.uuid4())}}
             
             # Ejecutar el grafo
             final_state = await self.app.ainvoke(initial_state, config=config)
@@ -77,7 +114,7 @@ class Pipeline:
             
             # Extraer status de manera segura
             if hasattr(processing_control, 'status'):
-                # Es un objeto Pydantic ProcessingControl
+                # Es un objeto ProcessingControl
                 status = processing_control.status
                 stage = processing_control.processing_stage
             elif isinstance(processing_control, dict):
@@ -145,11 +182,153 @@ class Pipeline:
             return result
             
         except Exception as e:
-            logger.error(f"Error en pipeline: {e}")
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error en pipeline: {e}")
+            return None
+
+    async def process_many(
+        self,
+        items: List[Tuple[str, str]],
+        max_concurrency: int = 8,
+        pipeline_slots: Optional[asyncio.Semaphore] = None,
+        document_hashes: Optional[List[Optional[str]]] = None,
+        file_sizes: Optional[List[Optional[int]]] = None
+    ) -> List[Union[Dict[str, Any], None, BaseException]]:
+        """
+        Procesa varias imágenes de forma concurrente.
+        El OCR de todo el lote se resuelve antes con peticiones por lotes a
+        Google Vision; luego un semáforo limita las invocaciones simultáneas
+        del grafo para no exceder los límites de peticiones de OpenAI.
+
+        Args:
+            items: Lista de tuplas (file_path, filename).
+            max_concurrency: Máximo de documentos procesándose a la vez.
+            pipeline_slots: Semáforo compartido con otras tareas (p. ej. el del
+                worker) que cada documento adquiere además de `max_concurrency`.
+            document_hashes: SHA256 de cada archivo calculado al subirlo (evita re-hashear).
+            file_sizes: Tamaño en bytes de cada archivo conocido al subirlo (evita el stat).
+
+        Returns:
+            Resultados en el mismo orden que `items` (una excepción en lugar
+            del resultado si ese documento falló).
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        texts: List[Optional[str]] = [None] * len(items)
+        extractions: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        tokens: List[int] = [0] * len(items)
+        hashes = document_hashes or [None] * len(items)
+        sizes = file_sizes or [None] * len(items)
+        if len(items) > 1:
+            texts = await asyncio.to_thread(
+                prefetch_ocr_texts, [file_path for file_path, _ in items], hashes
+            )
+
+            group_size = get_settings().llm_documents_per_request
+            if group_size > 1:
+                extractions, tokens = await self._extract_grouped(texts, group_size, semaphore)
+
+        async def _one(
+            item: Tuple[str, str],
+            raw_text: Optional[str],
+            data,
+            tokens_used: int,
+            document_hash: Optional[str],
+            file_size: Optional[int]
+        ) -> Dict[str, Any]:
+            async with semaphore, pipeline_slots or nullcontext():
+                return await self.process(
+                    *item,
+                    raw_text=raw_text,
+                    extracted_data=data,
+                    tokens_used=tokens_used,
+                    document_hash=document_hash,
+                    file_size=file_size
+                )
+
+        return await asyncio.gather(
+            *[_one(*args) for args in zip(items, texts, extractions, tokens, hashes, sizes)],
+            return_exceptions=True
+        )
+
+    async def _extract_grouped(
+        self,
+        texts: List[Optional[str]],
+        group_size: int,
+        semaphore: asyncio.Semaphore
+    ) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
+        """
+        Extrae los textos en grupos de `group_size` documentos por llamada al LLM.
+        Los documentos de un grupo que falle quedan en None y el nodo LLM los
+        procesa individualmente.
+        """
+        extractions: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        tokens: List[int] = [0] * len(texts)
+        indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        groups = [indices[start:start + group_size] for start in range(0, len(indices), group_size)]
+        client = get_async_openai_client()
+
+        async def _group(group: List[int]) -> None:
+            async with semaphore:
+                try:
+                    results, tokens_used = await aperform_openai_extraction_multi(
+                        client, [texts[i].strip() for i in group]
+                    )
+                except Exception as e:
+                    logger.warning(f"Extracción multi-documento falló, se extraerá por documento: {e}")
+                    return
+            for i, result in zip(group, results):
+                extractions[i] = result
+                tokens[i] = tokens_used // len(group)
+
+        await asyncio.gather(*[_group(group) for group in groups])
+        return extractions, tokens
+
+    async def submit_async_batch(self, items: List[Tuple[str, str]]) -> Tuple[str, List[Optional[str]]]:
+        """
+        Procesamiento diferido (no interactivo) para lotes grandes: hace el OCR
+        ahora y envía las extracciones al Batch API de OpenAI.
+
+        Args:
+            items: Lista de tuplas (file_path, filename). El custom_id de cada
+                documento es su posición en la lista.
+
+        Returns:
+            (ID del batch de OpenAI para collect_async_batch, texto OCR de cada
+            documento en el mismo orden, None si no se pudo leer). Con el texto
+            el pipeline se completa al recoger el batch sin volver a leer los archivos.
+
+        Raises:
+            ValueError: Si ningún documento tiene texto para extraer.
+        """
+        texts = await asyncio.to_thread(prefetch_ocr_texts, [file_path for file_path, _ in items])
+
+        states: Dict[str, PipelineState] = {}
+        for index, ((file_path, filename), raw_text) in enumerate(zip(items, texts)):
+            if not raw_text or not raw_text.strip():
+                logger.warning(f"Sin texto OCR para {filename}, se omite del batch")
+                continue
+            states[str(index)] = self.create_initial_state(file_path, filename, raw_text.strip())
+
+        if not states:
+            raise ValueError("Ningún documento del lote tiene texto para extraer")
+
+        batch_id = await perform_openai_batch_extraction(get_async_openai_client(), states)
+        return batch_id, texts
+
+    async def collect_async_batch(self, batch_id: str) -> Optional[Dict[int, Tuple[Optional[Dict[str, Any]], int]]]:
+        """
+        Obtiene los datos extraídos de un batch enviado con submit_async_batch.
+
+        Returns:
+            None si el batch aún no terminó; si no, {posición: (extracted_data o
+            None si esa petición falló, tokens usados)}.
+        """
+        results = await fetch_openai_batch_results(get_async_openai_client(), batch_id)
+        if results is None:
             return None
+        return {int(custom_id): outcome for custom_id, outcome in results.items()}
 
-    def create_initial_state(self, file_path: str, filename: str) -> PipelineState:
+    def create_initial_state(self, file_path: str, filename: str, raw_text: Optional[str] = None) -> PipelineState:
         """Crear estado inicial simplificado para imágenes."""
         
         document_info = DocumentInfo(
@@ -157,5 +336,7 @@ class Pipeline:
             filename=filename
         )
         
-        return PipelineState(document_info=document_info)
+        state = PipelineState(document_info=document_info)
+        state.processing_data.raw_text = raw_text
+        return state
 
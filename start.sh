@@ -0,0 +1,40 @@
+#!/bin/bash
+# Procesos del contenedor según APP_ROLE:
+#   api    -> solo la API (uvicorn)
+#   worker -> solo el worker de arq (OCR + LLM)
+#   all    -> ambos en el mismo contenedor (por defecto)
+set -euo pipefail
+
+API_CMD=(uvicorn main:app --host 0.0.0.0 --port "${PORT:-8000}")
+WORKER_CMD=(arq workers.WorkerSettings)
+
+case "${APP_ROLE:-all}" in
+    api)
+        exec "${API_CMD[@]}"
+        ;;
+    worker)
+        exec "${WORKER_CMD[@]}"
+        ;;
+    all)
+        "${WORKER_CMD[@]}" &
+        worker_pid=$!
+        "${API_CMD[@]}" &
+        api_pid=$!
+
+        # Reenviar la señal de parada a ambos procesos
+        trap 'kill -TERM "$worker_pid" "$api_pid" 2>/dev/null' TERM INT
+
+        # Si uno de los dos termina, se detiene el otro y el contenedor sale
+        # con su código (el orquestador lo reinicia)
+        set +e
+        wait -n "$worker_pid" "$api_pid"
+        status=$?
+        kill -TERM "$worker_pid" "$api_pid" 2>/dev/null
+        wait
+        exit "$status"
+        ;;
+    *)
+        echo "APP_ROLE desconocido: ${APP_ROLE} (usar api, worker o all)" >&2
+        exit 64
+        ;;
+esac
@@ -0,0 +1,68 @@
+"""
+Pruebas de la lectura de resultados del Batch API de OpenAI con un cliente falso.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from utils.llm_utils import fetch_openai_batch_results
+
+
+def _ok_line(custom_id: str, content: dict) -> bytes:
+    body = {
+        "choices": [{"message": {"content": orjson.dumps(content).decode()}}],
+        "usage": {"total_tokens": 42}
+    }
+    return orjson.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None})
+
+
+def _error_line(custom_id: str) -> bytes:
+    return orjson.dumps({
+        "custom_id": custom_id,
+        "response": {"status_code": 400, "body": {"error": {"message": "bad request"}}},
+        "error": None
+    })
+
+
+class _FakeClient:
+    def __init__(self, batch, files):
+        async def retrieve(batch_id):
+            return batch
+
+        async def content(file_id):
+            return SimpleNamespace(content=files[file_id])
+
+        self.batches = SimpleNamespace(retrieve=retrieve)
+        self.files = SimpleNamespace(content=content)
+
+
+def _batch(status="completed", output_file_id=None, error_file_id=None):
+    return SimpleNamespace(status=status, output_file_id=output_file_id, error_file_id=error_file_id)
+
+
+def test_failed_requests_from_error_file_map_to_none():
+    client = _FakeClient(
+        _batch(output_file_id="out", error_file_id="err"),
+        {"out": _ok_line("0", {"nombres": "ANA"}), "err": _error_line("1")}
+    )
+
+    results = asyncio.run(fetch_openai_batch_results(client, "batch_1"))
+
+    assert results == {"0": ({"nombres": "ANA"}, 42), "1": (None, 0)}
+
+
+def test_all_failed_batch_reads_only_the_error_file():
+    client = _FakeClient(_batch(error_file_id="err"), {"err": _error_line("0") + b"\n" + _error_line("1")})
+
+    results = asyncio.run(fetch_openai_batch_results(client, "batch_1"))
+
+    assert results == {"0": (None, 0), "1": (None, 0)}
+
+
+def test_batch_without_files_raises_and_pending_batch_returns_none():
+    assert asyncio.run(fetch_openai_batch_results(_FakeClient(_batch("in_progress"), {}), "b")) is None
+    with pytest.raises(RuntimeError):
+        asyncio.run(fetch_openai_batch_results(_FakeClient(_batch("expired"), {}), "b"))
@@ -0,0 +1,200 @@
+"""
+Pruebas de utils.ocr_utils con un Google Vision falso (sin red ni credenciales).
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import utils.ocr_utils as ocr_utils
+from models.settings import get_settings
+
+
+class _FakeVisionError(Exception):
+    """Sustituye a las excepciones de google.api_core en las pruebas."""
+
+
+def _fake_response(content: bytes):
+    """AnnotateImageResponse mínima: texto = contenido, 4 palabras con confianza fija."""
+    text = content.decode()
+    if text.startswith("ERR"):
+        annotation = SimpleNamespace(text="", pages=[])
+        return SimpleNamespace(error=SimpleNamespace(message="boom"), full_text_annotation=annotation)
+    words = [SimpleNamespace(confidence=c) for c in (0.5, 0.7, 0.9, 0.95)]
+    annotation = SimpleNamespace(
+        text=f"TEXT:{text}",
+        pages=[SimpleNamespace(blocks=[SimpleNamespace(paragraphs=[SimpleNamespace(words=words)])])]
+    )
+    return SimpleNamespace(error=SimpleNamespace(message=""), full_text_annotation=annotation)
+
+
+class _FakeRetryError(_FakeVisionError):
+    """Como google.api_core.exceptions.RetryError: guarda la última excepción en `cause`."""
+
+    def __init__(self, message, cause):
+        super().__init__(message)
+        self.cause = cause
+
+
+class _FakeFeature:
+    Type = SimpleNamespace(DOCUMENT_TEXT_DETECTION=11, TEXT_DETECTION=1)
+
+    def __init__(self, type_):
+        self.type_ = type_
+
+
+class _FakeAsyncClient:
+    """Misma superficie que ImageAnnotatorAsyncClient: solo batch_annotate_images."""
+
+    async def batch_annotate_images(self, requests, retry=None, timeout=None):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def fake_vision(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("CACHE_ENABLED", "false")
+    get_settings.cache_clear()
+
+    vision = SimpleNamespace(
+        Image=lambda content=None, source=None: SimpleNamespace(content=content, source=source),
+        ImageSource=lambda image_uri: SimpleNamespace(image_uri=image_uri),
+        ImageContext=lambda language_hints=None: SimpleNamespace(language_hints=language_hints),
+        Feature=_FakeFeature,
+        AnnotateImageRequest=lambda image, features, image_context=None: SimpleNamespace(
+            image=image, features=features, image_context=image_context
+        ),
+    )
+
+    monkeypatch.setattr(ocr_utils, "vision", vision, raising=False)
+    monkeypatch.setattr(ocr_utils, "VISION_AVAILABLE", True)
+    monkeypatch.setattr(ocr_utils, "AsyncRetry", None, raising=False)
+    monkeypatch.setattr(ocr_utils, "_vision_retry", lambda *args, **kwargs: None)
+    for name in ("DeadlineExceeded", "ResourceExhausted", "ServiceUnavailable", "InternalServerError"):
+        monkeypatch.setattr(ocr_utils, name, type(name, (_FakeVisionError,), {}), raising=False)
+    monkeypatch.setattr(ocr_utils, "RetryError", _FakeRetryError, raising=False)
+
+    ocr_utils.clear_ocr_cache()
+    yield vision
+    ocr_utils.clear_ocr_cache()
+    get_settings.cache_clear()
+
+
+def _write_pages(tmp_path, contents):
+    paths = []
+    for i, content in enumerate(contents):
+        path = tmp_path / f"page{i}.bin"
+        path.write_bytes(content.encode())
+        paths.append(str(path))
+    return paths
+
+
+def test_async_multi_page_uses_batch_annotate_images(fake_vision, tmp_path, monkeypatch):
+    async def batch_annotate_images(requests, retry=None, timeout=None):
+        assert len(requests) == 1
+        return SimpleNamespace(responses=[_fake_response(requests[0].image.content)])
+
+    # spec: cualquier método que no exista en el cliente asíncrono real falla
+    client = mock.create_autospec(_FakeAsyncClient, instance=True)
+    client.batch_annotate_images.side_effect = batch_annotate_images
+    monkeypatch.setattr(ocr_utils, "_get_async_vision_client", lambda: client)
+
+    paths = _write_pages(tmp_path, ["hola", "mundo", "ERR"])
+    text, confidence, metrics = asyncio.run(ocr_utils.extract_text_from_multiple_images_async(paths))
+
+    assert client.batch_annotate_images.await_count == 3
+    assert "TEXT:hola" in text and "TEXT:mundo" in text
+    assert confidence == pytest.approx(76.25)
+    assert metrics["successful_pages"] == 2
+    assert metrics["page_results"][2] == {"page": 3, "error": "Vision API error: boom", "status": "error"}
+
+
+def test_async_multi_page_passes_remote_uris_to_vision(fake_vision, tmp_path, monkeypatch):
+    sent = []
+
+    async def batch_annotate_images(requests, retry=None, timeout=None):
+        image = requests[0].image
+        sent.append(image)
+        content = image.content if image.content is not None else b"remoto"
+        return SimpleNamespace(responses=[_fake_response(content)])
+
+    client = mock.create_autospec(_FakeAsyncClient, instance=True)
+    client.batch_annotate_images.side_effect = batch_annotate_images
+    monkeypatch.setattr(ocr_utils, "_get_async_vision_client", lambda: client)
+
+    paths = _write_pages(tmp_path, ["local"]) + ["gs://bucket/page2.png"]
+    text, _, metrics = asyncio.run(ocr_utils.extract_text_from_multiple_images_async(paths))
+
+    assert metrics["successful_pages"] == 2
+    assert "TEXT:local" in text and "TEXT:remoto" in text
+    assert sent[1].source.image_uri == "gs://bucket/page2.png" and sent[1].content is None
+
+
+def test_multi_page_passes_remote_uris_to_vision(fake_vision, tmp_path, monkeypatch):
+    sent = []
+
+    def batch_text_detection(images, document, language_hints, timeout):
+        sent.extend(images)
+        return [_fake_response(image.content if image.content is not None else b"remoto") for image in images]
+
+    monkeypatch.setattr(ocr_utils, "_call_vision_batch_text_detection", batch_text_detection)
+
+    paths = ["https://example.com/page1.jpg"] + _write_pages(tmp_path, ["local"])
+    text, _, metrics = ocr_utils.extract_text_from_multiple_images(paths)
+
+    assert metrics["successful_pages"] == 2
+    assert "TEXT:remoto" in text and "TEXT:local" in text
+    assert sent[0].source.image_uri == "https://example.com/page1.jpg"
+
+
+@pytest.mark.parametrize("cause_name, error_type", [
+    ("ResourceExhausted", ocr_utils.OCRQuotaError),
+    ("ServiceUnavailable", ocr_utils.OCRUnavailableError),
+    ("InternalServerError", ocr_utils.OCRUnavailableError),
+    ("DeadlineExceeded", ocr_utils.OCRTimeoutError),
+])
+def test_retry_error_is_mapped_by_its_cause(fake_vision, tmp_path, monkeypatch, cause_name, error_type):
+    cause = getattr(ocr_utils, cause_name)("429/503/504")
+
+    async def batch_annotate_images(requests, retry=None, timeout=None):
+        raise ocr_utils.RetryError("Deadline of 20.0s exceeded", cause)
+
+    client = mock.create_autospec(_FakeAsyncClient, instance=True)
+    client.batch_annotate_images.side_effect = batch_annotate_images
+    monkeypatch.setattr(ocr_utils, "_get_async_vision_client", lambda: client)
+
+    paths = _write_pages(tmp_path, ["hola"])
+    with pytest.raises(error_type):
+        asyncio.run(ocr_utils._async_extract_page(client, paths[0], "es", asyncio.Semaphore(1)))
+
+
+def test_retry_error_without_cause_is_a_timeout(fake_vision):
+    error = ocr_utils._vision_error(ocr_utils.RetryError("Deadline exceeded", None), timeout=10.0)
+
+    assert isinstance(error, ocr_utils.OCRTimeoutError)
+
+
+def test_cache_hits_skip_downscaling(fake_vision, tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_ENABLED", "true")
+    get_settings.cache_clear()
+    downscaled = []
+
+    def fake_downscale(data, max_side=2048, quality=85):
+        downscaled.append(data)
+        return data
+
+    def batch_text_detection(images, document, language_hints, timeout):
+        return [_fake_response(image.content) for image in images]
+
+    monkeypatch.setattr(ocr_utils, "maybe_downscale_bytes", fake_downscale)
+    monkeypatch.setattr(ocr_utils, "_call_vision_batch_text_detection", batch_text_detection)
+
+    paths = _write_pages(tmp_path, ["hola", "mundo"])
+    first = ocr_utils.extract_text_from_multiple_images(paths)
+    second = ocr_utils.extract_text_from_multiple_images(paths)
+
+    assert first == second
+    # Solo el primer recorrido (sin cache) reduce las imágenes
+    assert sorted(downscaled) == [b"hola", b"mundo"]
@@ -0,0 +1,65 @@
+"""
+Pruebas del recorte de texto OCR en los prompts de extracción.
+"""
+
+import pytest
+
+import models.prompts as prompts
+from models.settings import get_settings
+
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("LLM_INPUT_TOKEN_BUDGET", "100")
+    get_settings.cache_clear()
+    # Sin tokenizer: recorte por caracteres (CHARS_PER_TOKEN por token)
+    monkeypatch.setattr(prompts, "_get_encoding", lambda model: None)
+    yield 100 * prompts.CHARS_PER_TOKEN
+    get_settings.cache_clear()
+
+
+def test_user_prompt_applies_token_budget(small_budget):
+    text = "A" * (small_budget * 5)
+
+    user_prompt = prompts.build_user_prompt(text)
+
+    assert "A" * small_budget in user_prompt
+    assert "A" * (small_budget + 1) not in user_prompt
+
+
+def test_every_prompt_builder_applies_token_budget(small_budget):
+    state = prompts.PipelineState(image_path="doc.png")
+    state.processing_data.raw_text = "B" * (small_budget * 5)
+
+    _, user_prompt = prompts.generate_extraction_prompts(state)
+    _, multi_prompt = prompts.generate_multi_extraction_prompts(["C" * (small_budget * 5), "D"])
+
+    assert "B" * (small_budget + 1) not in user_prompt
+    assert "C" * small_budget in multi_prompt
+    assert "C" * (small_budget + 1) not in multi_prompt
+
+
+def test_tokenizer_failures_are_retried(monkeypatch):
+    monkeypatch.setattr(prompts, "TIKTOKEN_AVAILABLE", True)
+    monkeypatch.setattr(prompts, "_encodings", {})
+    monkeypatch.setattr(prompts, "_encoding_failures", {})
+    clock = [1000.0]
+    monkeypatch.setattr(prompts.time, "monotonic", lambda: clock[0])
+    attempts = []
+
+    def encoding_for_model(model):
+        attempts.append(model)
+        if len(attempts) == 1:
+            raise OSError("sin red")
+        return "encoding"
+
+    monkeypatch.setattr(prompts, "tiktoken", type("T", (), {"encoding_for_model": staticmethod(encoding_for_model)}))
+
+    assert prompts._get_encoding("m") is None
+    # Dentro de la ventana de reintento no se vuelve a intentar
+    assert prompts._get_encoding("m") is None
+    clock[0] += prompts.ENCODING_RETRY_SECONDS
+    assert prompts._get_encoding("m") == "encoding"
+    assert prompts._get_encoding("m") == "encoding"
+    assert attempts == ["m", "m"]
@@ -1,5 +1,4 @@
 # Solo utilidades para imágenes y API
 from utils.api_utils import validate_document, save_temp_file
-from utils.llm_utils import perform_openai_extraction
 from utils.image_utils import is_image_file
 from utils.ocr_utils import validate_tesseract_installation
\ No newline at end of file
@@ -1,19 +1,107 @@
 from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple
 from fastapi import UploadFile, HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.concurrency import run_in_threadpool
+import aiofiles
+import aiofiles.os as aos
+import asyncio
+import contextlib
+import hashlib
+import os
+import queue
 import uuid
-from models.settings import settings
+from models.settings import get_settings
 
+# Tamaño de bloque para escribir uploads a disco (1 MiB)
+UPLOAD_CHUNK_SIZE = 1 << 20
 
-def validate_document(file: UploadFile) -> bytes:
+# Bytes iniciales usados para verificar la firma de la imagen
+HEADER_SNIFF_SIZE = 512
+
+# Margen para cabeceras multipart y campos del formulario
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class BufferPool:
     """
-    Valida que el archivo subido sea una imagen válida y cumple con las restricciones de tamaño.
+    Pool de buffers reutilizables para la lectura por bloques de los uploads.
+    Evita asignar un buffer nuevo por request; el tamaño máximo acota el RSS.
+    """
+
+    def __init__(self, buffer_size: int, max_buffers: int):
+        self.buffer_size = buffer_size
+        self._buffers: queue.LifoQueue = queue.LifoQueue(maxsize=max_buffers)
+
+    def acquire(self) -> bytearray:
+        """Obtiene un buffer del pool (o crea uno si está vacío)."""
+        try:
+            return self._buffers.get_nowait()
+        except queue.Empty:
+            return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray) -> None:
+        """Devuelve el buffer al pool; si está lleno, se descarta."""
+        try:
+            self._buffers.put_nowait(buffer)
+        except queue.Full:
+            pass
+
+
+upload_buffer_pool = BufferPool(UPLOAD_CHUNK_SIZE, max_buffers=max(2 * (os.cpu_count() or 1), 32))
+
+
+class ContentLengthLimitMiddleware:
+    """
+    Rechaza con 413 las peticiones cuyo Content-Length supera el límite de
+    la ruta, antes de que se reciba y se parsee el cuerpo multipart.
+    Middleware ASGI puro para no añadir coste a las demás rutas.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            limit = self.limits.get(scope["path"])
+            if limit is not None:
+                for name, value in scope["headers"]:
+                    if name == b"content-length":
+                        if value.isdigit() and int(value) > limit:
+                            response = JSONResponse(
+                                {"detail": f"Petición demasiado grande. Máximo permitido: {limit // (1024 * 1024)}MB"},
+                                status_code=413
+                            )
+                            await response(scope, receive, send)
+                            return
+                        break
+        await self.app(scope, receive, send)
+
+
+def upload_size_limits() -> Dict[str, int]:
+    """Tamaño máximo del cuerpo (bytes) para cada endpoint de subida."""
+    settings = get_settings()
+    per_file = settings.max_image_size_mb * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES
+    return {
+        "/upload": per_file,
+        "/process_batch": per_file * settings.batch_max_files
+    }
+
+
+def validate_document(file: UploadFile) -> str:
+    """
+    Valida que el archivo subido tenga nombre y extensión de imagen soportada.
     Solo acepta imágenes (JPG, PNG, TIFF, BMP). No soporta PDFs.
+    Si el tamaño ya es conocido se rechaza sin escribir nada a disco; el contenido
+    se valida mientras se escribe (ver save_temp_file).
 
     Args:
         file: Archivo subido por el usuario.
 
     Returns:
-        El contenido del archivo en bytes.
+        Extensión del archivo en minúsculas (ej. ".jpg").
 
     Raises:
         HTTPException: Si el archivo no es válido.
@@ -21,41 +109,48 @@ def validate_document(file: UploadFile) -> bytes:
     if not file.filename:
         raise HTTPException(status_code=400, detail="El archivo debe tener un nombre")
 
-    # Extensiones permitidas (solo imágenes)
-    image_extensions = ['.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp']
-    
-    filename_lower = file.filename.lower()
-    is_image = any(filename_lower.endswith(ext) for ext in image_extensions)
-    
-    if not is_image:
-        allowed_formats = ", ".join(image_extensions)
+    settings = get_settings()
+    ext = os.path.splitext(file.filename)[1].lower()
+
+    if ext not in settings.supported_image_formats_set:
+        allowed_formats = ", ".join(settings.supported_image_formats)
         raise HTTPException(
             status_code=400, 
             detail=f"Solo se aceptan imágenes. Formatos permitidos: {allowed_formats}"
         )
 
-    # Leer contenido del archivo
-    file_content = file.file.read()
-    file_size_mb = len(file_content) / (1024 * 1024)
-
-    # Validar tamaño de imagen
-    max_size = settings.max_image_size_mb
-    if file_size_mb > max_size:
+    if file.size is not None and file.size > settings.max_image_size_mb * 1024 * 1024:
         raise HTTPException(
             status_code=413,
-            detail=f"Imagen demasiado grande: {file_size_mb:.1f}MB. Máximo permitido: {max_size}MB"
+            detail=f"Imagen demasiado grande. Máximo permitido: {settings.max_image_size_mb}MB"
         )
-    
-    # Validar firmas básicas de imagen
-    if not _is_valid_image_content(file_content, filename_lower):
-        raise HTTPException(status_code=400, detail="El archivo no es una imagen válida")
 
-    return file_content
+    return ext
+
+
+# Longitud de las firmas indexadas en _MAGIC_BY_PREFIX
+MAGIC_PREFIX_SIZE = 4
+
+# Firma de 4 bytes (magic bytes) -> extensiones que la pueden tener; se busca
+# directamente con content[:MAGIC_PREFIX_SIZE]
+_MAGIC_BY_PREFIX = {
+    b'\x89PNG': frozenset({'png'}),
+    b'II*\x00': frozenset({'tif', 'tiff'}),
+    b'MM\x00*': frozenset({'tif', 'tiff'}),
+}
+
+# Firmas más cortas que MAGIC_PREFIX_SIZE (JPEG, BMP): no se pueden indexar por
+# un prefijo fijo, se comprueban con startswith si el dict no tiene la firma
+_SHORT_MAGIC = (
+    (b'\xff\xd8\xff', frozenset({'jpg', 'jpeg'})),
+    (b'BM', frozenset({'bmp'})),
+)
 
 
 def _is_valid_image_content(content: bytes, filename: str) -> bool:
     """
-    Valida que el contenido sea una imagen válida basándose en magic bytes.
+    Valida que el contenido sea una imagen válida basándose en magic bytes
+    y que la firma corresponda a la extensión del archivo.
     
     Args:
         content: Contenido del archivo en bytes
@@ -66,44 +161,137 @@ def _is_valid_image_content(content: bytes, filename: str) -> bool:
     """
     if not content:
         return False
-    
-    # Magic bytes para diferentes formatos de imagen
-    magic_bytes = {
-        'jpg': [b'\xff\xd8\xff'],
-        'jpeg': [b'\xff\xd8\xff'],
-        'png': [b'\x89\x50\x4e\x47'],
-        'tiff': [b'\x49\x49\x2a\x00', b'\x4d\x4d\x00\x2a'],
-        'tif': [b'\x49\x49\x2a\x00', b'\x4d\x4d\x00\x2a'],
-        'bmp': [b'\x42\x4d']
-    }
-    
-    # Obtener extensión del archivo
-    ext = filename.split('.')[-1].lower() if '.' in filename else ''
-    
-    # Verificar magic bytes
-    if ext in magic_bytes:
-        return any(content.startswith(magic) for magic in magic_bytes[ext])
-    
+
+    ext = os.path.splitext(filename)[1][1:].lower()
+
+    extensions = _MAGIC_BY_PREFIX.get(content[:MAGIC_PREFIX_SIZE])
+    if extensions is not None:
+        return ext in extensions
+
+    for prefix, extensions in _SHORT_MAGIC:
+        if content.startswith(prefix):
+            return ext in extensions
+
     return False
 
 
-def save_temp_file(file_content: bytes, filename: str, temp_dir: Path) -> Path:
+def _read_and_hash(source: BinaryIO, buffer: bytearray, hasher: "hashlib._Hash") -> int:
+    """Lee el siguiente bloque del upload en `buffer` y lo agrega al hash."""
+    read = source.readinto(buffer)
+    if read:
+        with memoryview(buffer) as view:
+            hasher.update(view[:read])
+    return read
+
+
+async def _write_one(file: UploadFile, temp_dir: Path) -> Tuple[Path, int, str]:
     """
-    Guarda el contenido del archivo en un archivo temporal.
+    Escribe un upload en el directorio temporal en una sola pasada:
+    firma de imagen, límite de tamaño, SHA256 y escritura por bloques.
 
     Args:
-        file_content: Contenido del archivo en bytes.
-        filename: Nombre original del archivo.
-        temp_dir: Directorio temporal donde guardar el archivo.
+        file: Archivo subido por el usuario.
+        temp_dir: Directorio temporal (ya existente).
 
     Returns:
-        La ruta al archivo temporal creado.
+        Tupla (ruta al archivo temporal creado, tamaño en bytes, SHA256 en hex).
+
+    Raises:
+        HTTPException: Si el contenido no es una imagen válida o es demasiado grande.
     """
-    temp_dir.mkdir(exist_ok=True)
-    temp_filename = f"upload_{uuid.uuid4().hex}_{filename}"
+    # Validar firmas básicas de imagen
+    header = await file.read(HEADER_SNIFF_SIZE)
+    if not _is_valid_image_content(header, file.filename.lower()):
+        raise HTTPException(status_code=400, detail="El archivo no es una imagen válida")
+
+    temp_filename = f"upload_{uuid.uuid4().hex}_{file.filename}"
     temp_file_path = temp_dir / temp_filename
 
-    with open(temp_file_path, 'wb') as temp_file:
-        temp_file.write(file_content)
+    max_size = get_settings().max_image_size_mb
+    max_bytes = max_size * 1024 * 1024
+    size = len(header)
+    hasher = hashlib.sha256(header)
+
+    buffer = upload_buffer_pool.acquire()
+    view = memoryview(buffer)
+    try:
+        async with aiofiles.open(temp_file_path, 'wb') as temp_file:
+            await temp_file.write(header)
+            while True:
+                # Lectura + SHA256 en el mismo hilo: hashlib libera el GIL y usa
+                # las extensiones SHA de la CPU, sin ocupar el event loop
+                read = await run_in_threadpool(_read_and_hash, file.file, buffer, hasher)
+                if not read:
+                    break
+                size += read
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Imagen demasiado grande. Máximo permitido: {max_size}MB"
+                    )
+                await temp_file.write(view[:read])
+    except BaseException:
+        # No dejar archivos parciales en el directorio temporal (también al cancelar)
+        with contextlib.suppress(FileNotFoundError):
+            await aos.remove(temp_file_path)
+        raise
+    finally:
+        view.release()
+        upload_buffer_pool.release(buffer)
+
+    return temp_file_path, size, hasher.hexdigest()
+
+
+async def save_temp_file(file: UploadFile, temp_dir: Path) -> Tuple[Path, int, str]:
+    """
+    Escribe el archivo subido en un archivo temporal por bloques, sin cargarlo
+    completo en memoria. Valida la firma de imagen con los primeros bytes,
+    corta la escritura en cuanto se supera el tamaño máximo y calcula el
+    SHA256 del contenido en la misma pasada.
+
+    Args:
+        file: Archivo subido por el usuario.
+        temp_dir: Directorio temporal donde guardar el archivo.
+
+    Returns:
+        Tupla (ruta al archivo temporal creado, tamaño en bytes, SHA256 en hex).
+
+    Raises:
+        HTTPException: Si el contenido no es una imagen válida o es demasiado grande.
+    """
+    await aos.makedirs(temp_dir, exist_ok=True)
+    return await _write_one(file, temp_dir)
+
+
+async def save_temp_files(files: List[UploadFile], temp_dir: Path) -> List[Tuple[Path, int, str]]:
+    """
+    Escribe varios uploads en paralelo con asyncio.TaskGroup.
+    Si algún archivo falla la validación se cancelan las demás escrituras
+    y se eliminan los temporales ya escritos (todo o nada).
+
+    Args:
+        files: Archivos subidos en la misma petición.
+        temp_dir: Directorio temporal donde guardar los archivos.
+
+    Returns:
+        Lista de tuplas (ruta, tamaño, SHA256) en el mismo orden que `files`.
+
+    Raises:
+        HTTPException: El primer error de validación encontrado.
+    """
+    await aos.makedirs(temp_dir, exist_ok=True)
+    tasks: List[asyncio.Task] = []
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for file in files:
+                tasks.append(tg.create_task(_write_one(file, temp_dir)))
+    except BaseExceptionGroup as group:
+        written = [
+            task.result()[0] for task in tasks
+            if task.done() and not task.cancelled() and task.exception() is None
+        ]
+        await asyncio.gather(*[aos.remove(path) for path in written], return_exceptions=True)
+        # Propagar el error original (p. ej. HTTPException 400/413) en vez del grupo
+        raise group.exceptions[0]
 
-    return temp_file_path
\ No newline at end of file
+    return [task.result() for task in tasks]
@@ -0,0 +1,80 @@
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+
+from models.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Import opcional: sin diskcache el pipeline funciona igual, solo sin cache persistente
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"diskcache no disponible: {e}")
+    DISKCACHE_AVAILABLE = False
+
+
+@lru_cache(maxsize=None)
+def _open_cache(directory: str) -> Optional["diskcache.Cache"]:
+    """
+    Abre (una vez por proceso) la cache en disco del directorio indicado.
+    Si no se puede abrir (permisos, disco lleno, SQLite bloqueado) se sigue sin cache.
+    """
+    if not DISKCACHE_AVAILABLE:
+        return None
+    try:
+        return diskcache.Cache(directory)
+    except Exception as e:
+        logger.warning(f"No se pudo abrir la cache en {directory}, se continúa sin cache: {e}")
+        return None
+
+
+def get_ocr_cache() -> Optional["diskcache.Cache"]:
+    """
+    Cache persistente de resultados OCR (compartida entre procesos).
+
+    Returns:
+        Cache o None si está deshabilitada o diskcache no está instalado.
+    """
+    settings = get_settings()
+    if not settings.cache_enabled or not settings.ocr_cache_dir:
+        return None
+    return _open_cache(settings.ocr_cache_dir)
+
+
+def get_llm_cache() -> Optional["diskcache.Cache"]:
+    """
+    Cache persistente de extracciones LLM (clave: modelo + prompts).
+
+    Returns:
+        Cache o None si está deshabilitada o diskcache no está instalado.
+    """
+    settings = get_settings()
+    if not settings.cache_enabled or not settings.llm_cache_dir:
+        return None
+    return _open_cache(settings.llm_cache_dir)
+
+
+def cache_get(cache: Optional["diskcache.Cache"], key: str) -> Optional[Any]:
+    """Lee una clave de la cache; los errores de cache nunca interrumpen el pipeline."""
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning(f"Error leyendo cache ({key[:24]}): {e}")
+        return None
+
+
+def cache_set(cache: Optional["diskcache.Cache"], key: str, value: Any) -> None:
+    """
+    Escribe una clave en la cache ignorando errores.
+    Las entradas (texto OCR y datos extraídos) expiran tras `cache_ttl_seconds`.
+    """
+    if cache is None:
+        return
+    try:
+        cache.set(key, value, expire=get_settings().cache_ttl_seconds or None)
+    except Exception as e:
+        logger.warning(f"Error escribiendo cache ({key[:24]}): {e}")
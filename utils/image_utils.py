@@ -1,11 +1,14 @@
+import hashlib
+import io
 import logging
 from pathlib import Path
+from typing import Union
 
 logger = logging.getLogger(__name__)
 
 # Imports opcionales
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
     PIL_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Pillow no disponible: {e}")
@@ -20,6 +23,65 @@ def is_image_file(file_path: Path) -> bool:
     return file_path.suffix.lower() in SUPPORTED_IMAGE_FORMATS
 
 
+def image_sha256(file_path: Union[str, Path]) -> str:
+    """SHA256 del contenido de la imagen (hex), leído por bloques."""
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def _encode_downscaled(image: "Image.Image", max_side: int, quality: int) -> bytes:
+    """Reduce la imagen (LANCZOS) a `max_side` y la re-codifica como JPEG."""
+    # En JPEG decodifica directamente a menor escala (mucho más rápido)
+    image.draft('RGB', (max_side, max_side))
+    # Aplicar la orientación EXIF antes de descartar los metadatos
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def maybe_downscale(file_path: Union[str, Path], max_side: int = 2048, quality: int = 85) -> bytes:
+    """
+    Bytes de la imagen listos para el OCR. Si el lado mayor supera `max_side`
+    se reduce (LANCZOS) y se re-codifica como JPEG; si no, se devuelve el
+    archivo original sin decodificarlo.
+
+    Args:
+        file_path: Ruta de la imagen
+        max_side: Lado máximo en píxeles
+        quality: Calidad JPEG al re-codificar
+
+    Returns:
+        bytes: Imagen original o reducida
+    """
+    # Un solo open: Pillow lee la cabecera del mismo descriptor y, si no hay
+    # que reducir, se rebobina y se lee el archivo completo en una sola lectura
+    with open(file_path, 'rb') as f:
+        if PIL_AVAILABLE:
+            with Image.open(f) as image:
+                if max(image.size) > max_side:
+                    return _encode_downscaled(image, max_side, quality)
+            f.seek(0)
+        return f.read()
+
+
+def maybe_downscale_bytes(data: bytes, max_side: int = 2048, quality: int = 85) -> bytes:
+    """
+    Igual que maybe_downscale pero sobre el contenido ya leído (sin volver a
+    abrir el archivo). Si no hay que reducir, devuelve los mismos bytes.
+    """
+    if not PIL_AVAILABLE:
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        if max(image.size) <= max_side:
+            return data
+        return _encode_downscaled(image, max_side, quality)
+
+
 def validate_image_dependencies():
     """Valida que Pillow esté disponible."""
     if not PIL_AVAILABLE:
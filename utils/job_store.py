@@ -0,0 +1,181 @@
+"""
+Almacenamiento de jobs respaldado por Redis.
+Permite compartir el estado entre varios workers/hosts y acota la memoria con TTL.
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import orjson
+import redis.asyncio as aioredis
+
+logger = logging.getLogger("JobStore")
+
+# Claves en Redis
+JOB_KEY_PREFIX = "job:"
+RESULT_KEY_PREFIX = "result:"
+DOCUMENT_KEY_PREFIX = "doc:"
+JOBS_BY_CREATED_KEY = "jobs:by_created"
+# zset job_id -> inicio (epoch); los jobs colgados se podan al contar
+ACTIVE_JOBS_KEY = "jobs:active_by_started"
+
+
+def now_ns() -> int:
+    """Marca de tiempo actual en nanosegundos (los jobs guardan enteros, no strings)."""
+    return time.time_ns()
+
+
+def ns_to_iso(timestamp_ns: Optional[int]) -> Optional[str]:
+    """Formatea una marca de tiempo en nanosegundos a ISO 8601 (solo al responder)."""
+    if timestamp_ns is None:
+        return None
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+
+class JobStatus:
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class JobStore:
+    """
+    Guarda cada job como un hash `job:<job_id>` (valores serializados en JSON)
+    y su resultado completo en una clave aparte `result:<job_id>`.
+    """
+
+    def __init__(self, redis_url: str, ttl_seconds: int = 3600, active_timeout_seconds: int = 300):
+        self.redis = aioredis.from_url(redis_url)
+        self.ttl_seconds = ttl_seconds
+        # Un job activo más antiguo que esto ya no puede seguir corriendo (timeout del worker)
+        self.active_timeout_seconds = active_timeout_seconds
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"{JOB_KEY_PREFIX}{job_id}"
+
+    @staticmethod
+    def _result_key(job_id: str) -> str:
+        return f"{RESULT_KEY_PREFIX}{job_id}"
+
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> Dict[str, bytes]:
+        return {key: orjson.dumps(value) for key, value in data.items()}
+
+    @staticmethod
+    def _decode(raw: Dict[bytes, bytes]) -> Dict[str, Any]:
+        return {key.decode(): orjson.loads(value) for key, value in raw.items()}
+
+    async def create(self, job_id: str, data: Dict[str, Any]) -> None:
+        """Crea el job, lo indexa por fecha de creación y lo marca como activo."""
+        key = self._job_key(job_id)
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=self._encode(data))
+            pipe.expire(key, self.ttl_seconds)
+            pipe.zadd(JOBS_BY_CREATED_KEY, {job_id: now})
+            # Podar del índice los jobs cuyo hash ya expiró por TTL
+            pipe.zremrangebyscore(JOBS_BY_CREATED_KEY, "-inf", f"({now - self.ttl_seconds}")
+            pipe.zadd(ACTIVE_JOBS_KEY, {job_id: now})
+            await pipe.execute()
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        """Actualiza campos del job y renueva su TTL."""
+        key = self._job_key(job_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=self._encode(fields))
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def start(self, job_id: str, **fields: Any) -> None:
+        """Actualiza el job al empezar a procesarlo y reinicia su marca de actividad."""
+        await self.update(job_id, **fields)
+        await self.redis.zadd(ACTIVE_JOBS_KEY, {job_id: time.time()})
+
+    async def finish(self, job_id: str, **fields: Any) -> None:
+        """Marca el job como terminado y lo quita de los jobs activos."""
+        await self.update(job_id, **fields)
+        await self.redis.zrem(ACTIVE_JOBS_KEY, job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna el job o None si no existe (o expiró)."""
+        raw = await self.redis.hgetall(self._job_key(job_id))
+        return self._decode(raw) if raw else None
+
+    async def delete(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Elimina el job y su resultado. Retorna los datos eliminados o None."""
+        job_data = await self.get(job_id)
+        if job_data is None:
+            return None
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._job_key(job_id), self._result_key(job_id))
+            pipe.zrem(JOBS_BY_CREATED_KEY, job_id)
+            pipe.zrem(ACTIVE_JOBS_KEY, job_id)
+            await pipe.execute()
+        return job_data
+
+    async def set_result(self, job_id: str, payload: bytes) -> None:
+        """Guarda el resultado completo del job (ya serializado en JSON) en su propia clave."""
+        await self.redis.set(self._result_key(job_id), payload, ex=self.ttl_seconds)
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        """Obtiene el resultado completo del job serializado en JSON, sin decodificar."""
+        return await self.redis.get(self._result_key(job_id))
+
+    async def get_document_result(self, document_hash: str) -> Optional[bytes]:
+        """Busca el resultado serializado de un documento idéntico procesado previamente."""
+        return await self.redis.get(f"{DOCUMENT_KEY_PREFIX}{document_hash}")
+
+    async def set_document_result(self, document_hash: str, payload: bytes, ttl_seconds: int) -> None:
+        """Guarda el resultado serializado indexado por el hash del contenido del documento."""
+        await self.redis.set(f"{DOCUMENT_KEY_PREFIX}{document_hash}", payload, ex=ttl_seconds)
+
+    async def list_recent(self, limit: int, fields: List[str]) -> List[Dict[str, Any]]:
+        """
+        Lista los jobs más recientes usando el índice ordenado por fecha.
+        Solo lee los campos pedidos (HMGET), sin recorrer todos los jobs.
+        """
+        if limit <= 0:
+            return []
+        job_ids = await self.redis.zrevrange(JOBS_BY_CREATED_KEY, 0, limit - 1)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hmget(self._job_key(job_id.decode()), fields)
+            rows = await pipe.execute()
+
+        jobs = []
+        for values in rows:
+            # Los jobs expirados o eliminados ya no tienen hash
+            if all(value is None for value in values):
+                continue
+            jobs.append({
+                field: orjson.loads(value)
+                for field, value in zip(fields, values)
+                if value is not None
+            })
+        return jobs
+
+    async def count_jobs(self) -> int:
+        """Cantidad de jobs en el índice (O(1))."""
+        return await self.redis.zcard(JOBS_BY_CREATED_KEY)
+
+    async def count_active_jobs(self) -> int:
+        """
+        Cantidad de jobs pendientes o en procesamiento.
+        Antes de contar poda los que superaron el timeout del worker: si un
+        worker muere a mitad de un job, `finish` nunca se llama y el job
+        quedaría contado como activo para siempre.
+        """
+        cutoff = time.time() - self.active_timeout_seconds
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(ACTIVE_JOBS_KEY, "-inf", f"({cutoff}")
+            pipe.zcard(ACTIVE_JOBS_KEY)
+            _, count = await pipe.execute()
+        return count
+
+    async def close(self) -> None:
+        """Cierra las conexiones con Redis."""
+        await self.redis.aclose()
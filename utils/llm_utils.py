@@ -1,48 +1,245 @@
+import asyncio
 import logging
-import json
-from typing import Dict, Tuple, Any
-from models.settings import settings
-from openai import OpenAI
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Any
+import orjson
+from models.prompts import (
+    generate_extraction_prompts,
+    generate_multi_extraction_prompts,
+)
+from models.settings import get_settings
+from models.state import PipelineState
+import httpx
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    RateLimitError,
+)
+from tenacity import (
+    AsyncRetrying,
+    before_sleep_log,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 logger = logging.getLogger(__name__)
 
-def perform_openai_extraction(client: OpenAI, text: str, current_data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+# Endpoint de las peticiones del Batch API de OpenAI
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Modo JSON de OpenAI: la respuesta es siempre un objeto JSON válido
+EXTRACTION_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Bloque de código markdown (```json ... ```) alrededor de la respuesta del modelo
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+
+# Estados de un batch que todavía no tiene resultados
+BATCH_PENDING_STATUSES = {"validating", "in_progress", "finalizing", "cancelling"}
+
+# Errores transitorios de OpenAI que se reintentan con backoff (el resto falla directo)
+OPENAI_TRANSIENT_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError)
+
+
+def _http_limits() -> httpx.Limits:
+    """Límites del pool de conexiones HTTP hacia OpenAI (sostienen la concurrencia de los lotes)."""
+    settings = get_settings()
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Cliente AsyncOpenAI compartido por el proceso.
+    Se crea una sola vez para reutilizar el pool de conexiones (TCP/TLS).
+    """
+    settings = get_settings()
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        timeout=settings.llm_request_timeout,
+        max_retries=settings.llm_max_retries,
+        http_client=DefaultAsyncHttpxClient(limits=_http_limits())
+    )
+
+def _openai_retry_kwargs() -> Dict[str, Any]:
+    """Política de reintentos para OpenAI: backoff exponencial con jitter solo en errores transitorios."""
+    settings = get_settings()
+    return dict(
+        retry=retry_if_exception_type(OPENAI_TRANSIENT_ERRORS),
+        wait=wait_exponential_jitter(initial=1, max=settings.llm_retry_max_wait),
+        stop=stop_after_attempt(settings.llm_retry_attempts),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+
+
+async def acall_openai(client: AsyncOpenAI, **kwargs: Any):
+    """chat.completions.create con reintentos ante rate limit, timeout o errores de conexión."""
+    async for attempt in AsyncRetrying(**_openai_retry_kwargs()):
+        with attempt:
+            return await client.chat.completions.create(**kwargs)
+
+
+def parse_extraction_content(content: str) -> Dict[str, Any]:
     """
-    Extracción usando OpenAI con sistema de prompts.
-    Retorna (campos extraídos, tokens usados)
+    Convierte la respuesta del modelo a dict. Con EXTRACTION_RESPONSE_FORMAT la
+    respuesta ya es JSON puro y basta un orjson.loads; quitar el bloque ```json
+    queda solo como respaldo para modelos sin modo JSON.
+    """
+    try:
+        result = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        result = orjson.loads(_FENCE_RE.sub("", content))
+
+    if not isinstance(result, dict):
+        raise ValueError("Respuesta de OpenAI no es un objeto JSON válido")
+    return result
+
+
+async def aperform_openai_extraction_multi(
+    client: AsyncOpenAI,
+    texts: List[str]
+) -> Tuple[List[Optional[Dict[str, Any]]], int]:
     """
-    from models.prompts import build_extraction_prompt
+    Extrae varios documentos en una sola llamada (system prompt e instrucciones
+    se envían una vez). El modelo responde {"documentos": [...]} en orden.
 
-    prompt_config = build_extraction_prompt(text[:2500], "first_pass")
-    
+    Returns:
+        (campos extraídos de cada texto en el mismo orden, tokens usados en total)
 
-    system_prompt = prompt_config["system"]
-    user_prompt = prompt_config["user"]
+    Raises:
+        ValueError: Si la respuesta no tiene un resultado por documento
+    """
+    settings = get_settings()
+    system_prompt, user_prompt = generate_multi_extraction_prompts(texts)
 
-    response = client.chat.completions.create(
+    response = await acall_openai(
+        client,
         model=settings.llm_model,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        max_tokens=1500,
+        max_tokens=1500 * len(texts),
         temperature=settings.llm_temperature,
-        top_p=0.9
+        top_p=0.9,
+        response_format=EXTRACTION_RESPONSE_FORMAT
     )
 
     tokens_used = response.usage.total_tokens if response.usage else 0
-    content = response.choices[0].message.content.strip()
+    documents = parse_extraction_content(response.choices[0].message.content).get("documentos")
 
-    # Limpiar formato JSON
-    if content.startswith("```json"):
-        content = content[7:]
-    if content.endswith("```"):
-        content = content[:-3]
+    if not isinstance(documents, list) or len(documents) != len(texts):
+        raise ValueError(f"Se esperaban {len(texts)} documentos en la respuesta de OpenAI")
 
-    result = json.loads(content.strip())
+    results = [doc if isinstance(doc, dict) else None for doc in documents]
+    logger.debug(f"Extracción multi-documento: {len(texts)} documentos, {tokens_used} tokens")
+    return results, tokens_used
 
-    if not isinstance(result, dict):
-        raise ValueError("Respuesta de OpenAI no es un objeto JSON válido")
 
-    logger.debug(f"Extracción exitosa: {len(result)} campos, {tokens_used} tokens")
-    return result, tokens_used
\ No newline at end of file
+async def perform_openai_batch_extraction(client: AsyncOpenAI, states: Dict[str, PipelineState]) -> str:
+    """
+    Envía la extracción de varios documentos al Batch API de OpenAI
+    (50% más barato y con límites propios, resultados en hasta 24h).
+
+    Args:
+        client: Cliente AsyncOpenAI
+        states: Estados con texto OCR indexados por custom_id
+
+    Returns:
+        ID del batch creado (consultar con fetch_openai_batch_results)
+    """
+    settings = get_settings()
+
+    lines = []
+    for custom_id, state in states.items():
+        system_prompt, user_prompt = generate_extraction_prompts(state)
+        lines.append(orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": settings.llm_model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                "max_tokens": 1500,
+                "temperature": settings.llm_temperature,
+                "top_p": 0.9,
+                "response_format": EXTRACTION_RESPONSE_FORMAT
+            }
+        }))
+
+    batch_file = await client.files.create(
+        file=("extraction_batch.jsonl", b"\n".join(lines)),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+
+    logger.info(f"Batch OpenAI creado: {batch.id} ({len(lines)} documentos)")
+    return batch.id
+
+
+async def fetch_openai_batch_results(
+    client: AsyncOpenAI,
+    batch_id: str
+) -> Optional[Dict[str, Tuple[Optional[Dict[str, Any]], int]]]:
+    """
+    Consulta un batch de OpenAI y, si terminó, parsea sus archivos de salida
+    y de errores (las peticiones fallidas solo aparecen en este último).
+
+    Args:
+        client: Cliente AsyncOpenAI
+        batch_id: ID retornado por perform_openai_batch_extraction
+
+    Returns:
+        None si el batch sigue en proceso; si no, {custom_id: (campos extraídos
+        o None si esa petición falló, tokens usados)}
+
+    Raises:
+        RuntimeError: Si el batch terminó sin ningún archivo (failed, expired, cancelled)
+    """
+    batch = await client.batches.retrieve(batch_id)
+    if batch.status in BATCH_PENDING_STATUSES:
+        return None
+    file_ids = [file_id for file_id in (batch.output_file_id, batch.error_file_id) if file_id]
+    if not file_ids:
+        raise RuntimeError(f"Batch {batch_id} terminó con estado {batch.status} sin resultados")
+
+    files = await asyncio.gather(*[client.files.content(file_id) for file_id in file_ids])
+    lines = [line for output in files for line in output.content.splitlines()]
+
+    results: Dict[str, Tuple[Optional[Dict[str, Any]], int]] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        custom_id = item["custom_id"]
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+
+        if item.get("error") or response.get("status_code") != 200:
+            logger.error(f"Batch {batch_id}: petición {custom_id} falló: {item.get('error') or body}")
+            results[custom_id] = (None, 0)
+            continue
+
+        tokens_used = (body.get("usage") or {}).get("total_tokens", 0)
+        try:
+            result = parse_extraction_content(body["choices"][0]["message"]["content"])
+        except (ValueError, KeyError, IndexError) as e:
+            logger.error(f"Batch {batch_id}: respuesta inválida para {custom_id}: {e}")
+            result = None
+        results[custom_id] = (result, tokens_used)
+
+    return results
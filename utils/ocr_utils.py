@@ -1,19 +1,197 @@
+import asyncio
+import atexit
+import hashlib
 import logging
 import os
-from typing import Tuple, Dict, List, Optional
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain, repeat
+from operator import attrgetter
+from typing import Any, Tuple, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from models.settings import get_settings
+from utils.image_utils import maybe_downscale_bytes
 
 logger = logging.getLogger(__name__)
 
 # Intentar importar cliente de Google Vision
 try:
     from google.cloud import vision
-    from google.api_core.retry import Retry
-    from google.api_core.exceptions import GoogleAPIError, RetryError
+    from google.api_core.retry import Retry, if_exception_type
+    from google.api_core.retry_async import AsyncRetry
+    from google.api_core.exceptions import (
+        DeadlineExceeded,
+        InternalServerError,
+        ResourceExhausted,
+        RetryError,
+        ServiceUnavailable,
+    )
     VISION_AVAILABLE = True
 except Exception as e:
     logger.warning(f"google-cloud-vision no disponible: {e}")
     VISION_AVAILABLE = False
 
+# Import opcional: BLAKE3 hashea varias veces más rápido; sin él se usa blake2b de hashlib
+try:
+    from blake3 import blake3 as _content_hasher
+    BLAKE3_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"blake3 no disponible, se usará blake2b: {e}")
+    _content_hasher = hashlib.blake2b
+    BLAKE3_AVAILABLE = False
+
+
+# Máximo de imágenes por petición BatchAnnotateImages de Google Vision
+VISION_BATCH_SIZE = 16
+
+# Caracteres de control que el OCR deja en el texto -> espacio (tabla para str.translate)
+_CONTROL_CHARS_TO_SPACE = str.maketrans({code: ' ' for code in (*range(0x00, 0x20), *range(0x7f, 0xa0))})
+
+# Timeout por llamada a Vision (segundos); los reintentos no pasan de 2x este valor
+VISION_REQUEST_TIMEOUT = 15.0
+# Timeout por llamada en documentos multi-página: una página lenta solo se retrasa a sí misma
+VISION_PAGE_TIMEOUT = 10.0
+
+# Acceso a la confianza de cada palabra de Vision (enlazado una vez)
+_WORD_CONFIDENCE = attrgetter('confidence')
+
+# Hilos para leer (y reducir) las páginas de un documento multi-página
+IMAGE_READ_WORKERS = 8
+
+# Resultados OCR en memoria (LRU), indexados por hash del contenido + idioma
+OCR_MEMORY_CACHE_SIZE = 256
+_ocr_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+# URIs que Vision descarga por su cuenta (la URI identifica el contenido)
+REMOTE_URI_PREFIXES = ("gs://", "http://", "https://")
+_ocr_cache_lock = threading.Lock()
+
+
+class OCRTimeoutError(RuntimeError):
+    """Google Vision no respondió dentro del timeout (incluidos los reintentos)."""
+
+
+class OCRQuotaError(RuntimeError):
+    """Cuota de Google Vision agotada (ResourceExhausted) incluso tras los reintentos."""
+
+
+class OCRUnavailableError(RuntimeError):
+    """Google Vision no disponible (ServiceUnavailable / error interno) incluso tras los reintentos."""
+
+
+@dataclass(slots=True)
+class OCRResult:
+    """
+    Respuesta de Vision de una imagen, compartida por todos los extractores.
+    El recorrido páginas→bloques→párrafos→palabras se hace una sola vez por umbral.
+    """
+    response: Any
+    language: str
+    _summaries: Dict[float, Tuple[str, float, Dict]] = field(default_factory=dict)
+
+    @property
+    def text(self) -> str:
+        full_text_annotation = self.response.full_text_annotation
+        return full_text_annotation.text if full_text_annotation else ""
+
+    def summarize(self, confidence_threshold: float = 60.0) -> Tuple[str, float, Dict]:
+        """(texto, confianza_promedio, métricas); las métricas son compartidas, no modificarlas."""
+        summary = self._summaries.get(confidence_threshold)
+        if summary is None:
+            summary = _summarize_vision_response(self.response, self.language, confidence_threshold)
+            self._summaries[confidence_threshold] = summary
+        return summary
+
+
+def _ocr_cache_key(image_bytes: bytes, language: str) -> str:
+    """Clave de cache: hash del contenido de la imagen (no de la ruta) + idioma."""
+    return f"{_content_hasher(image_bytes).hexdigest()}:{language}"
+
+
+def _is_remote_uri(image_path: str) -> bool:
+    """True si la ruta es una URI que Vision puede leer por sí mismo (GCS o HTTP)."""
+    return image_path.startswith(REMOTE_URI_PREFIXES)
+
+
+def _ocr_cache_get(key: str) -> Optional[OCRResult]:
+    """Resultado OCR cacheado o None (también None si la cache está deshabilitada)."""
+    if not get_settings().cache_enabled:
+        return None
+    with _ocr_cache_lock:
+        result = _ocr_cache.get(key)
+        if result is not None:
+            _ocr_cache.move_to_end(key)
+        return result
+
+
+def _ocr_cache_set(key: str, result: OCRResult) -> None:
+    """Guarda un resultado OCR exitoso, descartando el menos usado si se llena."""
+    if not get_settings().cache_enabled or result.response.error.message:
+        return
+    with _ocr_cache_lock:
+        _ocr_cache[key] = result
+        _ocr_cache.move_to_end(key)
+        while len(_ocr_cache) > OCR_MEMORY_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+
+def clear_ocr_cache() -> None:
+    """Vacía la cache en memoria de respuestas de Vision."""
+    with _ocr_cache_lock:
+        _ocr_cache.clear()
+
+
+# Cliente de Vision compartido por el proceso (un solo canal gRPC ya autenticado)
+_vision_client = None
+_vision_client_lock = threading.Lock()
+
+# Los clientes asíncronos quedan ligados al event loop donde se crean: uno por loop
+_async_vision_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _get_vision_client():
+    """ImageAnnotatorClient único del proceso (creación protegida con doble comprobación)."""
+    global _vision_client
+    if _vision_client is None:
+        with _vision_client_lock:
+            if _vision_client is None:
+                _vision_client = vision.ImageAnnotatorClient()
+                atexit.register(_close_vision_client)
+    return _vision_client
+
+
+def _close_vision_client() -> None:
+    """Cierra el canal del cliente compartido (al terminar el proceso)."""
+    global _vision_client
+    client, _vision_client = _vision_client, None
+    if client is not None:
+        try:
+            client.transport.close()
+        except Exception as e:
+            logger.debug(f"Error cerrando cliente de Vision: {e}")
+
+
+def _get_async_vision_client():
+    """ImageAnnotatorAsyncClient del event loop actual (se reutiliza entre llamadas)."""
+    loop = asyncio.get_running_loop()
+    client = _async_vision_clients.get(loop)
+    if client is None:
+        client = vision.ImageAnnotatorAsyncClient()
+        _async_vision_clients[loop] = client
+    return client
+
+
+@lru_cache(maxsize=1)
+def _vision_semaphore() -> threading.BoundedSemaphore:
+    """Límite de llamadas simultáneas a Google Vision por proceso (los nodos corren en threads)."""
+    return threading.BoundedSemaphore(get_settings().ocr_concurrency_limit)
+
 
 def validate_tesseract_installation() -> Tuple[bool, str]:
     """
@@ -50,24 +228,83 @@ def extract_text_with_google_vision(image_path: str, language: str = 'es') -> st
     Raises:
         Exception: Si hay error en la extracción
     """
-    logger.info(f"Extrayendo texto con Google Vision: {image_path}")
+    logger.info("Extrayendo texto con Google Vision: %s", image_path)
     
-    # Leer bytes de imagen
-    image_bytes = _read_image_bytes(image_path)
+    # Mismo resultado (y cache) que extract_text_with_tesseract
+    text = _ocr_core(image_path, language).text
+    # El texto completo solo se registra en DEBUG; formateo diferido con %
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Texto extraído: %s", text)
+    logger.info("Texto extraído: %d caracteres", len(text))
+    return text
+
+def extract_text_batch_with_google_vision(
+    image_paths: List[str],
+    language: str = 'es'
+) -> List[Optional[str]]:
+    """
+    Extraer texto de varias imágenes con BatchAnnotateImages (hasta 16 por petición).
+    Amortiza el round-trip y la autenticación entre todas las imágenes del lote.
+
+    Args:
+        image_paths: Rutas de las imágenes
+        language: Código de idioma (es para español)
 
-    # Llamar a Vision API
-    response = _call_vision_text_detection(
-        image_bytes,
+    Returns:
+        List[Optional[str]]: Texto de cada imagen en el mismo orden
+        (None si esa imagen falló en Vision).
+    """
+    responses = _call_vision_batch_text_detection(
+        [_build_vision_image(path) for path in image_paths],
         document=True,
         language_hints=[language] if language else None
     )
 
-    # Extraer texto completo
-    full_text_annotation = response.full_text_annotation
-    text = full_text_annotation.text if full_text_annotation else ""
-    logger.info(f"Texto extraído: {text} ")
-    logger.info(f"Texto extraído: {len(text)} caracteres")
-    return text
+    texts: List[Optional[str]] = []
+    for path, response in zip(image_paths, responses):
+        if response.error.message:
+            logger.error(f"Vision API error en {path}: {response.error.message}")
+            texts.append(None)
+            continue
+        full_text_annotation = response.full_text_annotation
+        texts.append(full_text_annotation.text if full_text_annotation else "")
+
+    logger.info(f"OCR por lotes completado: {len(image_paths)} imágenes")
+    return texts
+
+
+def _vision_retry(retry_cls: Optional[type] = None, timeout: float = VISION_REQUEST_TIMEOUT) -> "Retry":
+    """
+    Política de reintentos para las llamadas a Vision API.
+    Backoff exponencial con jitter solo ante cuota agotada (ResourceExhausted)
+    y errores transitorios; los errores definitivos fallan sin reintentar.
+    El plazo total (reintentos incluidos) es 2x el timeout de cada llamada.
+    Con `retry_cls=AsyncRetry` sirve para el cliente asíncrono.
+    """
+    return (retry_cls or Retry)(
+        initial=1.0,
+        maximum=10.0,
+        multiplier=2.0,
+        deadline=2 * timeout,
+        predicate=if_exception_type(
+            ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError
+        )
+    )
+
+
+def _vision_error(error: Exception, timeout: float) -> RuntimeError:
+    """
+    Error OCR según la causa real del fallo. Un RetryError solo indica que se
+    agotó el plazo de reintentos: su `cause` (la última excepción) distingue
+    un timeout de una cuota agotada o un servicio caído.
+    """
+    cause = error.cause if isinstance(error, RetryError) and error.cause is not None else error
+    if isinstance(cause, ResourceExhausted):
+        return OCRQuotaError(f"Cuota de Google Vision agotada: {cause}")
+    if isinstance(cause, (ServiceUnavailable, InternalServerError)):
+        return OCRUnavailableError(f"Google Vision no disponible: {cause}")
+    return OCRTimeoutError(f"Google Vision no respondió en {timeout}s: {error}")
+
 
 def _ensure_vision_available():
     """Verificar que Google Vision esté disponible."""
@@ -76,63 +313,317 @@ def _ensure_vision_available():
 
 
 def _read_image_bytes(image_path: str) -> bytes:
-    """Leer bytes de archivo de imagen."""
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Imagen no encontrada: {image_path}")
-    with open(image_path, 'rb') as f:
-        return f.read()
+    """
+    Leer bytes de archivo de imagen.
+    Sin comprobar antes si existe (el open ya falla) y sin el buffer de Python:
+    fstat da el tamaño exacto y se lee de una vez.
+    """
+    try:
+        fd = os.open(image_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Imagen no encontrada: {image_path}") from None
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        # Lecturas parciales (poco comunes en archivos regulares)
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+    finally:
+        os.close(fd)
+
+
+def _downscale_for_vision(image_bytes: bytes, image_path: str) -> bytes:
+    """
+    Con `ocr_preprocess_images` activo, las fotos más grandes que
+    `ocr_max_image_side` se reducen (LANCZOS) y re-codifican como JPEG:
+    menos bytes que subir y procesar sin perder legibilidad en el OCR.
+    Solo se llama cuando la imagen va a Vision (no en aciertos de cache).
+    """
+    settings = get_settings()
+    if not settings.ocr_preprocess_images:
+        return image_bytes
+    try:
+        return maybe_downscale_bytes(image_bytes, max_side=settings.ocr_max_image_side)
+    except Exception as e:
+        # Formato que Pillow no decodifica: se envían los bytes originales
+        logger.debug(f"No se pudo reducir {image_path}, se envía el original: {e}")
+        return image_bytes
+
+
+def _prepare_image_for_vision(image_path: str) -> bytes:
+    """Leer la imagen para Vision (reducida si es más grande de lo que Vision aprovecha)."""
+    return _downscale_for_vision(_read_image_bytes(image_path), image_path)
+
+
+def _prepare_page(image_path: str, language: str) -> Tuple[Optional[bytes], str]:
+    """
+    (bytes originales, clave de cache) de una página. La clave es el hash del
+    archivo tal cual: un acierto de cache no paga decodificar ni reducir la
+    imagen (ver _vision_image_for_miss). Las URIs remotas no se leen aquí:
+    Vision las descarga directamente y se cachean por la propia URI.
+    """
+    if _is_remote_uri(image_path):
+        return None, f"uri:{image_path}:{language}"
+    image_bytes = _read_image_bytes(image_path)
+    return image_bytes, _ocr_cache_key(image_bytes, language)
+
+
+def _vision_image_for_miss(image_path: str, image_bytes: Optional[bytes]) -> "vision.Image":
+    """Imagen para Vision de una página sin resultado en cache (se reduce solo ahora)."""
+    if image_bytes is not None:
+        image_bytes = _downscale_for_vision(image_bytes, image_path)
+    return _build_vision_image(image_path, image_bytes)
+
+
+def _prepare_page_or_error(
+    image_path: str,
+    language: str
+) -> Tuple[Optional[Tuple[Optional[bytes], str]], Optional[str]]:
+    """((bytes, clave), None) si la página se pudo preparar; (None, mensaje) si no."""
+    try:
+        return _prepare_page(image_path, language), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _build_vision_image(image_path: str, image_bytes: Optional[bytes] = None) -> "vision.Image":
+    """
+    Imagen para Vision. Las URIs remotas (gs://, http(s)://) se pasan como
+    ImageSource y Vision las descarga del lado del servidor, sin subir bytes
+    desde aquí; las rutas locales se envían como contenido.
+
+    Args:
+        image_path: Ruta local o URI remota
+        image_bytes: Contenido ya leído de la ruta local (si no, se lee aquí)
+    """
+    _ensure_vision_available()
+    if _is_remote_uri(image_path):
+        return vision.Image(source=vision.ImageSource(image_uri=image_path))
+    if image_bytes is None:
+        image_bytes = _prepare_image_for_vision(image_path)
+    return vision.Image(content=image_bytes)
 
 
 def _call_vision_text_detection(
-    image_bytes: bytes, 
+    image: "vision.Image", 
     document: bool = True, 
     language_hints: Optional[List[str]] = None, 
-    max_retries: int = 3
+    max_retries: int = 3,
+    timeout: float = VISION_REQUEST_TIMEOUT
 ) -> dict:
     """
     Llamar a Google Vision API para detección de texto.
     
     Args:
-        image_bytes: Bytes de la imagen
+        image: Imagen de Vision (ver _build_vision_image)
         document: Si usar Document Text Detection (mejor para documentos)
         language_hints: Sugerencias de idioma
         max_retries: Máximo reintentos
+        timeout: Timeout de cada llamada en segundos
         
     Returns:
         Respuesta de Vision API
+
+    Raises:
+        OCRTimeoutError: Si Vision no responde a tiempo
+        OCRQuotaError / OCRUnavailableError: Si los reintentos terminan por cuota o servicio caído
     """
     _ensure_vision_available()
 
-    client = vision.ImageAnnotatorClient()
-    image = vision.Image(content=image_bytes)
+    client = _get_vision_client()
 
     # Configurar retry
-    retry = Retry(
-        initial=0.1, 
-        maximum=2.0, 
-        multiplier=2.0, 
-        deadline=30.0,
-        predicate=lambda exc: isinstance(exc, (GoogleAPIError, RetryError))
-    )
+    retry = _vision_retry(timeout=timeout)
 
     try:
-        if document:
-            # Preferir Document Text Detection para documentos
-            response = client.document_text_detection(image=image, retry=retry)
-        else:
-            # Text Detection simple
-            response = client.text_detection(image=image, retry=retry)
+        with _vision_semaphore():
+            if document:
+                # Preferir Document Text Detection para documentos
+                response = client.document_text_detection(image=image, retry=retry, timeout=timeout)
+            else:
+                # Text Detection simple
+                response = client.text_detection(image=image, retry=retry, timeout=timeout)
 
         if response.error.message:
             raise RuntimeError(f"Vision API error: {response.error.message}")
 
         return response
     
+    except (DeadlineExceeded, RetryError, ResourceExhausted, ServiceUnavailable, InternalServerError) as e:
+        error = _vision_error(e, timeout)
+        logger.error(f"Error en Google Vision API: {error}")
+        raise error from e
     except Exception as e:
         logger.error(f"Error en Google Vision API: {e}")
         raise
 
 
+def _call_vision_batch_text_detection(
+    images: List["vision.Image"],
+    document: bool = True,
+    language_hints: Optional[List[str]] = None,
+    timeout: float = VISION_REQUEST_TIMEOUT
+) -> list:
+    """
+    Llamar a Google Vision con BatchAnnotateImages (hasta VISION_BATCH_SIZE imágenes por petición).
+    Un solo round-trip cubre varias páginas en lugar de uno por página.
+
+    Args:
+        images: Imágenes de Vision (ver _build_vision_image)
+        document: Si usar Document Text Detection (mejor para documentos)
+        language_hints: Sugerencias de idioma
+        timeout: Timeout de cada petición por lotes en segundos
+
+    Returns:
+        Lista de AnnotateImageResponse en el mismo orden que la entrada
+        (los errores por imagen quedan en `response.error`).
+
+    Raises:
+        OCRTimeoutError: Si Vision no responde a tiempo
+        OCRQuotaError / OCRUnavailableError: Si los reintentos terminan por cuota o servicio caído
+    """
+    _ensure_vision_available()
+
+    client = _get_vision_client()
+    feature_type = (
+        vision.Feature.Type.DOCUMENT_TEXT_DETECTION if document else vision.Feature.Type.TEXT_DETECTION
+    )
+    feature = vision.Feature(type_=feature_type)
+    image_context = vision.ImageContext(language_hints=language_hints) if language_hints else None
+    retry = _vision_retry(timeout=timeout)
+
+    def annotate_chunk(chunk: List["vision.Image"]) -> list:
+        requests = [
+            vision.AnnotateImageRequest(image=image, features=[feature], image_context=image_context)
+            for image in chunk
+        ]
+        try:
+            with _vision_semaphore():
+                batch_response = client.batch_annotate_images(
+                    requests=requests, retry=retry, timeout=timeout
+                )
+        except (DeadlineExceeded, RetryError, ResourceExhausted, ServiceUnavailable, InternalServerError) as e:
+            error = _vision_error(e, timeout)
+            logger.error(f"Error en Google Vision API (lote): {error}")
+            raise error from e
+        except Exception as e:
+            logger.error(f"Error en Google Vision API (lote): {e}")
+            raise
+        return batch_response.responses
+
+    chunks = [
+        images[start:start + VISION_BATCH_SIZE]
+        for start in range(0, len(images), VISION_BATCH_SIZE)
+    ]
+    if len(chunks) <= 1:
+        return [response for chunk in chunks for response in annotate_chunk(chunk)]
+
+    # Varios lotes: en paralelo (gRPC libera el GIL mientras espera la respuesta),
+    # acotados también por el semáforo de Vision del proceso
+    max_workers = min(get_settings().ocr_concurrency_limit, len(chunks))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = [
+            response
+            for chunk_responses in executor.map(annotate_chunk, chunks)
+            for response in chunk_responses
+        ]
+
+    return responses
+
+
+def _summarize_vision_response(
+    response,
+    language: str,
+    confidence_threshold: float = 60.0
+) -> Tuple[str, float, Dict]:
+    """
+    Texto, confianza promedio y métricas de una respuesta de Vision.
+
+    Returns:
+        Tuple[str, float, Dict]: (texto, confianza_promedio, métricas)
+    """
+    # Extraer texto completo
+    full_text_annotation = response.full_text_annotation
+    text = full_text_annotation.text if full_text_annotation else ""
+
+    # Sin texto (ej. reverso en blanco del documento) no hay palabras que recorrer
+    if not text:
+        return "", 0.0, {
+            "total_words": 0,
+            "avg_confidence": 0.0,
+            "low_confidence_words": 0,
+            "high_confidence_words": 0,
+            "text_length": 0,
+            "engine": "google_vision",
+            "language": language,
+            "confidence_distribution": {"high": 0, "medium": 0, "low": 0}
+        }
+
+    # El recorrido de palabras usa el protobuf subyacente (`_pb`): evita los
+    # descriptores de proto-plus en cada acceso, que dominan en páginas densas
+    raw_annotation = getattr(response, '_pb', response).full_text_annotation
+
+    # Confianza de cada palabra en un array (Google Vision da 0.0 a 1.0, convertir a porcentaje);
+    # promedio y conteos se resuelven con reducciones vectorizadas. Los niveles se
+    # aplanan con chain y la confianza se lee con un attrgetter ya enlazado: el
+    # recorrido por palabra queda en C en lugar de bytecode
+    flatten = chain.from_iterable
+    words = flatten(
+        paragraph.words
+        for paragraph in flatten(
+            block.paragraphs for block in flatten(page.blocks for page in raw_annotation.pages)
+        )
+    )
+    word_confidences = np.fromiter(map(_WORD_CONFIDENCE, words), dtype=np.float64) * 100.0
+
+    total_words = int(word_confidences.size)
+    low_confidence_words = int(np.count_nonzero(word_confidences < confidence_threshold))
+    high_confidence_words = int(np.count_nonzero(word_confidences >= max(80.0, confidence_threshold)))
+    avg_confidence = float(word_confidences.mean()) if total_words else 0.0
+
+    # Métricas detalladas
+    metrics = {
+        "total_words": total_words,
+        "avg_confidence": round(avg_confidence, 2),
+        "low_confidence_words": low_confidence_words,
+        "high_confidence_words": high_confidence_words,
+        "text_length": len(text),
+        "engine": "google_vision",
+        "language": language,
+        "confidence_distribution": {
+            "high": high_confidence_words,
+            "medium": total_words - low_confidence_words - high_confidence_words,
+            "low": low_confidence_words
+        }
+    }
+
+    return text, avg_confidence, metrics
+
+
+def _ocr_core(image_path: str, language: str) -> OCRResult:
+    """
+    OCR de una imagen con Google Vision, consultando antes la cache en memoria.
+    Base común de extract_text_with_google_vision y extract_text_with_tesseract.
+    """
+    image_bytes, cache_key = _prepare_page(image_path, language)
+
+    # Llamar a Vision API (salvo que la misma imagen ya se haya procesado)
+    result = _ocr_cache_get(cache_key)
+    if result is None:
+        response = _call_vision_text_detection(
+            _vision_image_for_miss(image_path, image_bytes),
+            document=True,
+            language_hints=[language] if language else None
+        )
+        result = OCRResult(response, language)
+        _ocr_cache_set(cache_key, result)
+    return result
+
+
 def extract_text_with_tesseract(
     image_path: str,
     language: str = 'es',
@@ -151,64 +642,17 @@ def extract_text_with_tesseract(
     Returns:
         Tuple[str, float, Dict]: (texto, confianza_promedio, métricas)
     """
-    logger.info(f"Extrayendo texto con Google Vision: {image_path}")
+    logger.info("Extrayendo texto con Google Vision: %s", image_path)
     
-    # Leer bytes de imagen
-    image_bytes = _read_image_bytes(image_path)
-
-    # Llamar a Vision API
     try:
-        response = _call_vision_text_detection(
-            image_bytes,
-            document=True,
-            language_hints=[language] if language else None
-        )
-
-        # Extraer texto completo
-        full_text_annotation = response.full_text_annotation
-        text = full_text_annotation.text if full_text_annotation else ""
-
-        # Calcular confianza promedio a partir de las palabras
-        confidences = []
-        total_words = 0
-        low_confidence_words = 0
-        high_confidence_words = 0
-        
-        for page in full_text_annotation.pages:
-            for block in page.blocks:
-                for paragraph in block.paragraphs:
-                    for word in paragraph.words:
-                        # Google Vision da confianza de 0.0 a 1.0, convertir a porcentaje
-                        word_confidence = getattr(word, 'confidence', 0.0) * 100.0
-                        confidences.append(word_confidence)
-                        total_words += 1
-                        
-                        if word_confidence < confidence_threshold:
-                            low_confidence_words += 1
-                        elif word_confidence >= 80:
-                            high_confidence_words += 1
-
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
-
-        # Métricas detalladas
-        metrics = {
-            "total_words": total_words,
-            "avg_confidence": round(avg_confidence, 2),
-            "low_confidence_words": low_confidence_words,
-            "high_confidence_words": high_confidence_words,
-            "text_length": len(text),
-            "engine": "google_vision",
-            "language": language,
-            "confidence_distribution": {
-                "high": high_confidence_words,
-                "medium": total_words - low_confidence_words - high_confidence_words,
-                "low": low_confidence_words
-            }
-        }
+        text, avg_confidence, metrics = _ocr_core(image_path, language).summarize(confidence_threshold)
 
-        logger.info(f"Texto extraído: {len(text)} caracteres, confianza: {avg_confidence:.1f}%")
+        logger.info("Texto extraído: %d caracteres, confianza: %.1f%%", len(text), avg_confidence)
         return text, avg_confidence, metrics
 
+    except (FileNotFoundError, OCRTimeoutError, OCRQuotaError, OCRUnavailableError):
+        # Imagen ilegible, timeout, cuota o servicio caído: se propagan con su propio tipo
+        raise
     except Exception as e:
         logger.error(f"Error en OCR con Google Vision: {e}")
         raise RuntimeError(f"Error en Google Vision OCR: {str(e)}")
@@ -217,7 +661,8 @@ def extract_text_with_tesseract(
 def extract_text_from_multiple_images(
     image_paths: List[str],
     language: str = 'es',
-    config: str = ''
+    config: str = '',
+    timeout: float = VISION_PAGE_TIMEOUT
 ) -> Tuple[str, float, Dict]:
     """
     Extraer texto de múltiples imágenes usando Google Vision.
@@ -226,6 +671,7 @@ def extract_text_from_multiple_images(
         image_paths: Lista de rutas de imágenes
         language: Código de idioma
         config: Ignorado (compatibilidad)
+        timeout: Timeout por llamada a Vision en segundos
         
     Returns:
         Tuple[str, float, Dict]: (texto_combinado, confianza_promedio, métricas)
@@ -235,8 +681,127 @@ def extract_text_from_multiple_images(
 
     logger.info(f"Procesando {len(image_paths)} imágenes con Google Vision")
     
+    page_sources: Dict[int, Tuple[Optional[bytes], str]] = {}
+    page_errors: Dict[int, str] = {}
+    page_results: Dict[int, OCRResult] = {}
+    pending: Dict[str, List[int]] = {}
+    pending_bytes: Dict[str, Optional[bytes]] = {}
+    images: List["vision.Image"] = []
+    with ThreadPoolExecutor(max_workers=min(IMAGE_READ_WORKERS, len(image_paths))) as executor:
+        # Leer y hashear todas las páginas en paralelo (las URIs remotas no se
+        # leen); las que fallen quedan como error
+        prepared = executor.map(_prepare_page_or_error, image_paths, repeat(language))
+        for i, (source, error) in enumerate(prepared):
+            if error is None:
+                page_sources[i] = source
+            else:
+                page_errors[i] = error
+
+        # Páginas ya cacheadas no van a Vision; las duplicadas se envían una sola vez
+        for i, (image_bytes, cache_key) in page_sources.items():
+            result = _ocr_cache_get(cache_key)
+            if result is not None:
+                page_results[i] = result
+            else:
+                pending.setdefault(cache_key, []).append(i)
+                pending_bytes.setdefault(cache_key, image_bytes)
+
+        # Solo las páginas que van a Vision se reducen (en paralelo: Pillow libera el GIL)
+        if pending:
+            try:
+                images = list(executor.map(
+                    _vision_image_for_miss,
+                    [image_paths[pending[cache_key][0]] for cache_key in pending_bytes],
+                    pending_bytes.values()
+                ))
+            except Exception as e:
+                page_errors.update({i: str(e) for indexes in pending.values() for i in indexes})
+                pending = {}
+
+    # Una petición BatchAnnotateImages cubre hasta VISION_BATCH_SIZE páginas
+    if pending:
+        try:
+            responses = _call_vision_batch_text_detection(
+                images,
+                document=True,
+                language_hints=[language] if language else None,
+                timeout=timeout
+            )
+            for cache_key, response in zip(pending_bytes, responses):
+                result = OCRResult(response, language)
+                _ocr_cache_set(cache_key, result)
+                for i in pending[cache_key]:
+                    page_results[i] = result
+        except Exception as e:
+            page_errors.update({i: str(e) for indexes in pending.values() for i in indexes})
+
+    return _combine_page_results(image_paths, page_results, page_errors)
+
+
+def iter_extract_text(
+    image_paths: List[str],
+    language: str = 'es',
+    confidence_threshold: float = 60.0
+) -> Iterator[Tuple[int, str, float, Dict]]:
+    """
+    Extraer texto de varias imágenes entregando cada página en cuanto termina
+    (orden de llegada, no de entrada), para que una UI pueda mostrar las
+    primeras páginas mientras las demás siguen en Vision.
+    Usa una llamada por página, en paralelo (hasta `ocr_concurrency_limit`).
+
+    Args:
+        image_paths: Lista de rutas de imágenes
+        language: Código de idioma
+        confidence_threshold: Umbral de confianza
+
+    Yields:
+        Tuple[int, str, float, Dict]: (índice_página, texto, confianza, métricas);
+        si la página falla: ("", 0.0, {"status": "error", "error": mensaje})
+    """
+    if not image_paths:
+        return
+
+    max_workers = min(get_settings().ocr_concurrency_limit, len(image_paths))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(_ocr_core, image_path, language): i
+            for i, image_path in enumerate(image_paths)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                text, confidence, metrics = future.result().summarize(confidence_threshold)
+            except Exception as e:
+                logger.error(f"Error procesando página {i+1}: {e}")
+                yield i, "", 0.0, {"status": "error", "error": str(e)}
+                continue
+            yield i, text, confidence, metrics
+    finally:
+        # Si el consumidor deja de iterar, no esperar a las páginas pendientes
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _combine_page_results(
+    image_paths: List[str],
+    page_results: Dict[int, OCRResult],
+    page_errors: Dict[int, str]
+) -> Tuple[str, float, Dict]:
+    """
+    Combina los resultados OCR de cada página en (texto, confianza, métricas).
+
+    Args:
+        image_paths: Rutas de las páginas, en orden
+        page_results: Resultado OCR por índice de página
+        page_errors: Mensaje de error por índice de página (lectura o RPC)
+
+    Returns:
+        Tuple[str, float, Dict]: (texto_combinado, confianza_promedio, métricas)
+    """
     all_texts = []
     all_confidences = []
+    # Total de palabras acumulado en el mismo recorrido (sin segunda pasada)
+    total_words = 0
     combined_metrics = {
         "total_pages": len(image_paths),
         "successful_pages": 0,
@@ -247,15 +812,19 @@ def extract_text_from_multiple_images(
 
     for i, image_path in enumerate(image_paths):
         try:
-            logger.debug(f"Procesando página {i+1}/{len(image_paths)}: {image_path}")
-            
-            text, confidence, metrics = extract_text_with_tesseract(
-                image_path, 
-                language=language, 
-                config=config
-            )
+            logger.debug("Procesando página %d/%d: %s", i + 1, len(image_paths), image_path)
+
+            if i in page_errors:
+                raise RuntimeError(page_errors[i])
+            result = page_results[i]
+            if result.response.error.message:
+                raise RuntimeError(f"Vision API error: {result.response.error.message}")
+
+            text, confidence, metrics = result.summarize()
 
             if text.strip():
+                page_words = metrics.get("total_words", 0)
+                total_words += page_words
                 all_texts.append(f"--- PÁGINA {i+1} ---\n{text}")
                 all_confidences.append(confidence)
                 combined_metrics["successful_pages"] += 1
@@ -264,7 +833,7 @@ def extract_text_from_multiple_images(
                     "text_length": len(text),
                     "confidence": round(confidence, 2),
                     "status": "success",
-                    "words": metrics.get("total_words", 0)
+                    "words": page_words
                 })
             else:
                 combined_metrics["failed_pages"] += 1
@@ -292,7 +861,7 @@ def extract_text_from_multiple_images(
         "total_text_length": len(combined_text),
         "avg_confidence": round(avg_confidence, 2),
         "pages_with_text": len(all_texts),
-        "total_words": sum(result.get("words", 0) for result in combined_metrics["page_results"] if result.get("words"))
+        "total_words": total_words
     })
 
     logger.info(f"OCR multi-página completado: {len(all_texts)}/{len(image_paths)} páginas exitosas")
@@ -300,6 +869,88 @@ def extract_text_from_multiple_images(
     return combined_text, avg_confidence, combined_metrics
 
 
+async def _async_extract_page(
+    async_client,
+    image_path: str,
+    language: str,
+    semaphore: asyncio.Semaphore,
+    timeout: float = VISION_PAGE_TIMEOUT
+):
+    """Lee una página y la envía a Vision con el cliente asíncrono (acotado por el semáforo)."""
+    image_bytes, cache_key = await asyncio.to_thread(_prepare_page, image_path, language)
+    result = _ocr_cache_get(cache_key)
+    if result is not None:
+        return result
+    image = await asyncio.to_thread(_vision_image_for_miss, image_path, image_bytes)
+
+    # El cliente asíncrono no tiene los helpers por feature (document_text_detection
+    # solo existe en el síncrono): se usa batch_annotate_images con una sola petición
+    request = vision.AnnotateImageRequest(
+        image=image,
+        features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+        image_context=vision.ImageContext(language_hints=[language]) if language else None
+    )
+    async with semaphore:
+        try:
+            batch_response = await async_client.batch_annotate_images(
+                requests=[request],
+                retry=_vision_retry(AsyncRetry, timeout=timeout),
+                timeout=timeout
+            )
+        except (DeadlineExceeded, RetryError, ResourceExhausted, ServiceUnavailable, InternalServerError) as e:
+            raise _vision_error(e, timeout) from e
+    response = batch_response.responses[0]
+    if response.error.message:
+        raise RuntimeError(f"Vision API error: {response.error.message}")
+    result = OCRResult(response, language)
+    _ocr_cache_set(cache_key, result)
+    return result
+
+
+async def extract_text_from_multiple_images_async(
+    image_paths: List[str],
+    language: str = 'es',
+    config: str = '',
+    timeout: float = VISION_PAGE_TIMEOUT
+) -> Tuple[str, float, Dict]:
+    """
+    Variante asíncrona de extract_text_from_multiple_images: una llamada a Vision
+    por página, todas concurrentes (hasta `ocr_concurrency_limit` a la vez).
+    La latencia pasa de la suma de las páginas a la página más lenta.
+
+    Args:
+        image_paths: Lista de rutas de imágenes
+        language: Código de idioma
+        config: Ignorado (compatibilidad)
+        timeout: Timeout por llamada a Vision en segundos
+
+    Returns:
+        Tuple[str, float, Dict]: (texto_combinado, confianza_promedio, métricas)
+    """
+    if not image_paths:
+        return "", 0.0, {"error": "No hay imágenes para procesar"}
+
+    _ensure_vision_available()
+    logger.info(f"Procesando {len(image_paths)} imágenes con Google Vision (async)")
+
+    async_client = _get_async_vision_client()
+    semaphore = asyncio.Semaphore(min(get_settings().ocr_concurrency_limit, len(image_paths)))
+    outcomes = await asyncio.gather(
+        *(_async_extract_page(async_client, path, language, semaphore, timeout) for path in image_paths),
+        return_exceptions=True
+    )
+
+    page_results: Dict[int, OCRResult] = {}
+    page_errors: Dict[int, str] = {}
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            page_errors[i] = str(outcome)
+        else:
+            page_results[i] = outcome
+
+    return _combine_page_results(image_paths, page_results, page_errors)
+
+
 def clean_ocr_text_for_licenses(text: str) -> str:
     """
     Limpia texto OCR específicamente para documentos de identidad.
@@ -313,19 +964,9 @@ def clean_ocr_text_for_licenses(text: str) -> str:
     if not text:
         return ""
 
-    # Normalizar espacios y saltos de línea
-    cleaned_text = ' '.join(text.split())
-    
-    # Remover caracteres especiales comunes del OCR que interfieren
-    import re
-    
-    # Remover caracteres de control
-    cleaned_text = re.sub(r'[\x00-\x1f\x7f-\x9f]', ' ', cleaned_text)
-    
-    # Normalizar espacios múltiples
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
-    
-    return cleaned_text.strip()
+    # Remover caracteres de control (una pasada de translate, sin regex) y
+    # normalizar espacios y saltos de línea en una sola pasada de split/join
+    return ' '.join(text.translate(_CONTROL_CHARS_TO_SPACE).split())
 
 
 def optimize_tesseract_config_for_document(image_path: str) -> str:
@@ -0,0 +1,438 @@
+"""
+Worker de procesamiento basado en arq.
+Ejecuta el pipeline (OCR + LLM) fuera del proceso HTTP para que la API responda
+de inmediato y los workers escalen de forma independiente.
+
+Ejecutar con: arq workers.WorkerSettings
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import aiofiles.os as aos
+from arq import func
+from arq.connections import RedisSettings
+from dotenv import load_dotenv
+from pydantic_core import to_json
+
+# Cargar variables de entorno
+load_dotenv()
+
+from models.settings import get_settings
+
+# Configurar logging una sola vez (los módulos solo crean sus loggers)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=get_settings().log_level
+    )
+logger = logging.getLogger("Worker")
+
+from pipeline import Pipeline
+from models.prompts import warm_up_tokenizer
+from models.result import EnhancedResult
+from utils.job_store import JobStore, JobStatus, now_ns
+
+# Ventana de un batch de OpenAI (24h) más margen para que el propio batch expire
+OPENAI_BATCH_WINDOW_SECONDS = 25 * 3600
+# Fallos seguidos al consultar un batch antes de abandonarlo y extraer por documento
+OPENAI_BATCH_MAX_POLL_ERRORS = 10
+
+
+async def startup(ctx: Dict[str, Any]) -> None:
+    """Inicializa recursos compartidos por todas las tareas del worker."""
+    settings = get_settings()
+    # Cargar el tokenizer fuera del event loop antes de aceptar tareas
+    await asyncio.to_thread(warm_up_tokenizer)
+    ctx["pipeline"] = Pipeline()
+    # Pipelines (OCR + LLM) simultáneos en todo el worker: max_jobs cuenta un
+    # lote como un solo job, así que cada documento toma aquí su propio turno
+    ctx["pipeline_slots"] = asyncio.Semaphore(settings.max_concurrent_pipeline_jobs)
+    ctx["job_store"] = JobStore(
+        settings.redis_url,
+        ttl_seconds=settings.job_ttl_seconds,
+        active_timeout_seconds=settings.batch_job_timeout
+    )
+
+
+async def shutdown(ctx: Dict[str, Any]) -> None:
+    """Libera recursos del worker."""
+    await ctx["job_store"].close()
+
+
+async def _store_outcome(
+    job_store: JobStore,
+    job_id: str,
+    result: Optional[Dict[str, Any]],
+    document_hash: Optional[str] = None
+) -> None:
+    """Guarda el resultado del pipeline y marca el job como COMPLETED o FAILED."""
+    settings = get_settings()
+
+    # Verificar si el procesamiento falló según el resultado
+    if result and result.get("processing_control", {}).get("status") == "FAILED":
+        # El pipeline falló, marcar job como FAILED
+        error_details = result.get("error_details", {})
+        error_msg = "; ".join(error_details.get("errors", ["Error desconocido en pipeline"]))
+        
+        await job_store.finish(
+            job_id,
+            status=JobStatus.FAILED,
+            completed_at=now_ns(),
+            error=error_msg,
+            error_details=error_details
+        )
+        
+        logger.error(f"[{job_id}] Pipeline falló: {error_msg}")
+        return
+    
+    # Verificar si el resultado es None (error crítico)
+    if result is None:
+        await job_store.finish(
+            job_id,
+            status=JobStatus.FAILED,
+            completed_at=now_ns(),
+            error="Error crítico en pipeline - resultado nulo"
+        )
+        
+        logger.error(f"[{job_id}] Error crítico: resultado nulo")
+        return
+    
+    # Procesamiento exitoso: estructura tipada para el frontend
+    enhanced_result = EnhancedResult.from_pipeline_result(result)
+    
+    # Serializar una sola vez (pydantic-core); /result devuelve estos bytes tal cual
+    payload = to_json(enhanced_result)
+
+    # El resultado va en su propia clave para que /status siga siendo barato.
+    # Las escrituras son independientes entre sí, se envían en paralelo.
+    writes = [job_store.set_result(job_id, payload)]
+    if document_hash and settings.document_cache_ttl_seconds:
+        # Cache por contenido: re-subidas del mismo documento no vuelven a pasar por OCR + LLM
+        writes.append(job_store.set_document_result(
+            document_hash,
+            payload,
+            ttl_seconds=settings.document_cache_ttl_seconds
+        ))
+    await asyncio.gather(*writes)
+
+    # Marcar COMPLETED solo cuando el resultado ya está guardado
+    await job_store.finish(
+        job_id,
+        status=JobStatus.COMPLETED,
+        completed_at=now_ns()
+    )
+    
+    logger.info(f"[{job_id}] Procesamiento completado exitosamente")
+
+
+async def _remove_temp_file(job_id: str, file_path: str) -> None:
+    """Elimina el archivo temporal del job (si aún existe)."""
+    try:
+        await aos.remove(file_path)
+        logger.info(f"[{job_id}] Archivo temporal eliminado: {file_path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"[{job_id}] Error eliminando archivo: {e}")
+
+
+async def _store_batch_outcomes(
+    job_store: JobStore,
+    jobs: List[Dict[str, Any]],
+    results: List[Any]
+) -> None:
+    """Guarda el resultado de cada job de un lote (una excepción marca solo ese job como FAILED)."""
+    for job, result in zip(jobs, results):
+        job_id = job["job_id"]
+        try:
+            if isinstance(result, BaseException):
+                raise result
+            await _store_outcome(job_store, job_id, result, job.get("document_hash"))
+        except Exception as e:
+            logger.exception(f"[{job_id}] Error en procesamiento: {str(e)}")
+            await job_store.finish(
+                job_id,
+                status=JobStatus.FAILED,
+                completed_at=now_ns(),
+                error=str(e)
+            )
+
+
+async def process_file(
+    ctx: Dict[str, Any],
+    job_id: str,
+    file_path: str,
+    filename: str,
+    document_hash: Optional[str] = None,
+    file_size: Optional[int] = None
+):
+    """Tarea arq: procesa el archivo con el pipeline y actualiza el estado del job."""
+    job_store: JobStore = ctx["job_store"]
+    pipeline: Pipeline = ctx["pipeline"]
+
+    try:
+        logger.info(f"[{job_id}] Iniciando procesamiento de: {filename}")
+        
+        # Actualizar estado a PROCESSING
+        await job_store.start(
+            job_id,
+            status=JobStatus.PROCESSING,
+            started_at=now_ns()
+        )
+
+        # Procesar archivo con el pipeline
+        async with ctx["pipeline_slots"]:
+            result = await pipeline.process(
+                file_path=file_path,
+                filename=filename,
+                document_hash=document_hash,
+                file_size=file_size
+            )
+        await _store_outcome(job_store, job_id, result, document_hash)
+
+    except asyncio.CancelledError:
+        # job_timeout de arq (o apagado del worker): no dejar el job en PROCESSING
+        logger.error(f"[{job_id}] Procesamiento cancelado (timeout de {get_settings().worker_job_timeout}s)")
+        await job_store.finish(
+            job_id,
+            status=JobStatus.FAILED,
+            completed_at=now_ns(),
+            error=f"Tiempo de procesamiento agotado ({get_settings().worker_job_timeout}s)"
+        )
+        raise
+        
+    except Exception as e:
+        logger.exception(f"[{job_id}] Error en procesamiento: {str(e)}")
+        
+        # Actualizar con error
+        await job_store.finish(
+            job_id,
+            status=JobStatus.FAILED,
+            completed_at=now_ns(),
+            error=str(e)
+        )
+    
+    finally:
+        # Limpiar archivo temporal
+        await _remove_temp_file(job_id, file_path)
+
+
+async def _fail_unfinished(job_store: JobStore, jobs: List[Dict[str, Any]], error: str) -> None:
+    """Marca como FAILED los jobs del lote que todavía no terminaron (los ya guardados se respetan)."""
+    async def _fail(job_id: str) -> None:
+        job_data = await job_store.get(job_id)
+        if job_data and job_data.get("status") in (JobStatus.PENDING, JobStatus.PROCESSING):
+            await job_store.finish(job_id, status=JobStatus.FAILED, completed_at=now_ns(), error=error)
+
+    await asyncio.gather(*[_fail(job["job_id"]) for job in jobs])
+
+
+async def process_batch(ctx: Dict[str, Any], batch_id: str, jobs: List[Dict[str, Any]]):
+    """
+    Tarea arq: procesa un lote de archivos de forma concurrente (Pipeline.process_many).
+    Cada elemento de `jobs` tiene job_id, file_path, filename, document_hash y file_size.
+    """
+    job_store: JobStore = ctx["job_store"]
+    pipeline: Pipeline = ctx["pipeline"]
+    settings = get_settings()
+
+    try:
+        logger.info(f"[{batch_id}] Iniciando lote de {len(jobs)} documentos")
+
+        started_at = now_ns()
+        await asyncio.gather(*[
+            job_store.start(job["job_id"], status=JobStatus.PROCESSING, started_at=started_at)
+            for job in jobs
+        ])
+
+        results = await pipeline.process_many(
+            [(job["file_path"], job["filename"]) for job in jobs],
+            max_concurrency=settings.batch_max_concurrency,
+            pipeline_slots=ctx["pipeline_slots"],
+            document_hashes=[job.get("document_hash") for job in jobs],
+            file_sizes=[job.get("file_size") for job in jobs]
+        )
+
+        await _store_batch_outcomes(job_store, jobs, results)
+
+    except asyncio.CancelledError:
+        # job_timeout de arq (o apagado del worker): no dejar jobs en PROCESSING
+        logger.error(f"[{batch_id}] Lote cancelado (timeout de {settings.batch_job_timeout}s)")
+        await _fail_unfinished(job_store, jobs, f"Tiempo de procesamiento agotado ({settings.batch_job_timeout}s)")
+        raise
+
+    except Exception as e:
+        logger.exception(f"[{batch_id}] Error procesando lote: {str(e)}")
+        await _fail_unfinished(job_store, jobs, str(e))
+
+    finally:
+        await asyncio.gather(*[
+            _remove_temp_file(job["job_id"], job["file_path"]) for job in jobs
+        ])
+
+
+async def submit_openai_batch(ctx: Dict[str, Any], batch_id: str, jobs: List[Dict[str, Any]]):
+    """
+    Tarea arq: lote diferido (/process_batch?deferred=true). Hace el OCR y envía
+    las extracciones al Batch API de OpenAI; collect_openai_batch recoge los
+    resultados más tarde. Los archivos temporales se borran al terminar el OCR.
+    """
+    job_store: JobStore = ctx["job_store"]
+    pipeline: Pipeline = ctx["pipeline"]
+    settings = get_settings()
+
+    try:
+        logger.info(f"[{batch_id}] Enviando lote diferido de {len(jobs)} documentos")
+
+        started_at = now_ns()
+        await asyncio.gather(*[
+            job_store.start(job["job_id"], status=JobStatus.PROCESSING, started_at=started_at)
+            for job in jobs
+        ])
+
+        openai_batch_id, texts = await pipeline.submit_async_batch(
+            [(job["file_path"], job["filename"]) for job in jobs]
+        )
+        for job, raw_text in zip(jobs, texts):
+            job["raw_text"] = raw_text
+
+        await ctx["redis"].enqueue_job(
+            "collect_openai_batch",
+            batch_id,
+            openai_batch_id,
+            jobs,
+            time.time(),
+            _defer_by=settings.openai_batch_poll_seconds
+        )
+        logger.info(f"[{batch_id}] Lote enviado a OpenAI: {openai_batch_id}")
+
+    except Exception as e:
+        logger.exception(f"[{batch_id}] Error enviando lote diferido: {str(e)}")
+        await asyncio.gather(*[
+            job_store.finish(job["job_id"], status=JobStatus.FAILED, completed_at=now_ns(), error=str(e))
+            for job in jobs
+        ])
+
+    finally:
+        await asyncio.gather(*[
+            _remove_temp_file(job["job_id"], job["file_path"]) for job in jobs
+        ])
+
+
+async def _requeue_collect(
+    ctx: Dict[str, Any],
+    batch_id: str,
+    openai_batch_id: str,
+    jobs: List[Dict[str, Any]],
+    submitted_at: float,
+    failed_polls: int
+) -> None:
+    """Renueva el TTL de los jobs y vuelve a consultar el batch tras `openai_batch_poll_seconds`."""
+    job_store: JobStore = ctx["job_store"]
+    await asyncio.gather(*[
+        job_store.start(job["job_id"], status=JobStatus.PROCESSING) for job in jobs
+    ])
+    await ctx["redis"].enqueue_job(
+        "collect_openai_batch",
+        batch_id,
+        openai_batch_id,
+        jobs,
+        submitted_at,
+        failed_polls,
+        _defer_by=get_settings().openai_batch_poll_seconds
+    )
+
+
+async def collect_openai_batch(
+    ctx: Dict[str, Any],
+    batch_id: str,
+    openai_batch_id: str,
+    jobs: List[Dict[str, Any]],
+    submitted_at: Optional[float] = None,
+    failed_polls: int = 0
+):
+    """
+    Tarea arq: consulta el batch de OpenAI de un lote diferido. Si sigue en
+    proceso se vuelve a encolar; si terminó, completa el pipeline de cada
+    documento con su texto OCR y su extracción. Las peticiones que fallaron
+    en el batch (o todo el lote, si el batch falló, expiró o se canceló) se
+    extraen en el nodo LLM.
+
+    Un error transitorio al consultar (red, 5xx, rate limit) no abandona el
+    batch: se reintenta más tarde, hasta OPENAI_BATCH_MAX_POLL_ERRORS fallos
+    seguidos o hasta agotar la ventana de 24h del batch.
+    """
+    job_store: JobStore = ctx["job_store"]
+    pipeline: Pipeline = ctx["pipeline"]
+    settings = get_settings()
+    if submitted_at is None:
+        submitted_at = time.time()
+
+    try:
+        extractions = await pipeline.collect_async_batch(openai_batch_id)
+    except RuntimeError as e:
+        # El batch terminó sin resultados (failed, expired, cancelled)
+        logger.warning(f"[{batch_id}] Batch {openai_batch_id} sin resultados, se extrae por documento: {e}")
+        extractions = {}
+    except Exception as e:
+        failed_polls += 1
+        window_over = time.time() - submitted_at > OPENAI_BATCH_WINDOW_SECONDS
+        if failed_polls < OPENAI_BATCH_MAX_POLL_ERRORS and not window_over:
+            logger.warning(
+                f"[{batch_id}] Error consultando batch {openai_batch_id} "
+                f"({failed_polls}/{OPENAI_BATCH_MAX_POLL_ERRORS}), se reintenta: {e}"
+            )
+            await _requeue_collect(ctx, batch_id, openai_batch_id, jobs, submitted_at, failed_polls)
+            return
+        logger.error(f"[{batch_id}] Batch {openai_batch_id} inaccesible, se extrae por documento: {e}")
+        extractions = {}
+
+    if extractions is None:
+        await _requeue_collect(ctx, batch_id, openai_batch_id, jobs, submitted_at, 0)
+        return
+
+    logger.info(f"[{batch_id}] Batch {openai_batch_id} terminado, completando {len(jobs)} documentos")
+    semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+
+    async def _complete(index: int, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        extracted_data, tokens_used = extractions.get(index, (None, 0))
+        async with semaphore, ctx["pipeline_slots"]:
+            return await pipeline.process(
+                job["file_path"],
+                job["filename"],
+                # Sin texto OCR el nodo de imagen marca el documento como fallido
+                raw_text=job.get("raw_text") or "",
+                extracted_data=extracted_data,
+                tokens_used=tokens_used,
+                document_hash=job.get("document_hash"),
+                file_size=job.get("file_size")
+            )
+
+    results = await asyncio.gather(
+        *[_complete(index, job) for index, job in enumerate(jobs)],
+        return_exceptions=True
+    )
+    await _store_batch_outcomes(job_store, jobs, results)
+
+
+class WorkerSettings:
+    """Configuración del worker arq."""
+    # Las tareas de lote procesan varios documentos: su timeout escala con el tamaño del lote
+    functions = [
+        process_file,
+        func(process_batch, timeout=get_settings().batch_job_timeout),
+        func(submit_openai_batch, timeout=get_settings().batch_job_timeout),
+        func(collect_openai_batch, timeout=get_settings().batch_job_timeout),
+    ]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(get_settings().redis_url)
+    poll_delay = get_settings().worker_poll_delay
+    # Acota las tareas simultáneas por worker; los pipelines de cada documento
+    # (también los de un lote) se acotan con ctx["pipeline_slots"]
+    max_jobs = get_settings().max_concurrent_pipeline_jobs
+    # Timeout de process_file; /health poda los jobs activos con el de los lotes (el mayor)
+    job_timeout = get_settings().worker_job_timeout